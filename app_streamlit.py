@@ -5,12 +5,16 @@ Execute com: python -m streamlit run app_streamlit.py
 """
 from __future__ import annotations
 
+import functools
 import io
 import sys
 import html as _html
 import uuid
 import re
 import csv
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime as _dt
 from pathlib import Path
 from urllib.parse import quote
 
@@ -26,7 +30,7 @@ import os
 from dotenv import load_dotenv
 load_dotenv(Path(__file__).resolve().parents[1] / ".env")
 
-from rag_core import init_rag, answer_question, suggest_follow_up_questions
+from rag_core import init_rag, answer_question_stream
 
 # Nomes exibidos no chat (estilo ChatPetrobras): usuário logado e assistente
 CHAT_NOME_USUARIO = os.environ.get("CHAT_NOME_USUARIO") or "Nome da pessoa logada"
@@ -34,9 +38,24 @@ CHAT_NOME_ASSISTENTE = "JackChat"
 
 # Avatar transparente 1x1 para nao exibir letra no circulo (só o nome em texto)
 import base64 as _b64
-_AVATAR_TRANSPARENTE = _b64.b64decode(
-    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=="
-)
+_AVATAR_B64 = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=="
+
+
+@functools.cache
+def _avatar() -> bytes:
+    """Avatar transparente 1x1, decodificado sob demanda (bytes unicos e estaveis)."""
+    return _b64.b64decode(_AVATAR_B64)
+
+# Formato de carimbo de data/hora dos exports (compartilhado entre formatos)
+_TS_FMT = "%d/%m/%Y %H:%M"
+
+# Regexes compiladas uma unica vez (chamadas por celula/linha nos loops de export)
+_RE_WS = re.compile(r"\s+")
+_RE_CSV_BLOCK = re.compile(r"```(?:csv|text)?\n([\s\S]*?)```", re.IGNORECASE)
+
+# Pool dos exportadores: os quatro formatos sao montados em paralelo apos
+# cada resposta, entao o tempo visivel e o do mais lento, nao a soma
+_EXPORT_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="export")
 
 
 @st.cache_resource(show_spinner=False)
@@ -58,23 +77,80 @@ def _img_to_b64(path: str) -> str:
     return base64.b64encode(Path(path).read_bytes()).decode("utf-8")
 
 
+@st.cache_data(ttl=30, show_spinner=False)
+def _list_pdfs(root: str, mtime: float) -> list[str]:
+    """Nomes dos PDFs da pasta (recursivo, via os.scandir; cache de 30s por mtime).
+
+    scandir devolve dirents com stat em cache — bem mais rapido que
+    Path.glob("**/*.pdf") e a maioria dos reruns nem toca o filesystem.
+    """
+    nomes: list[str] = []
+    stack = [root]
+    while stack:
+        atual = stack.pop()
+        try:
+            with os.scandir(atual) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.lower().endswith(".pdf"):
+                        nomes.append(entry.name)
+        except OSError:
+            continue
+    nomes.sort()
+    return nomes
+
+
+try:
+    from cachetools import TTLCache
+except ImportError:
+    TTLCache = None
+
+
 @st.cache_resource(show_spinner=False)
 def _memory_store() -> dict[str, dict]:
     # Armazenamento em memória do processo (não grava em arquivo).
     # Mantém histórico mesmo se a página recarregar, enquanto o Streamlit estiver rodando.
+    # TTLCache poe teto no crescimento: sessoes acima de MAX_SESSIONS ou
+    # sem atividade ha mais de SESSION_TTL_S segundos sao descartadas
+    # (_store_update reinsere a chave a cada atualizacao, renovando o TTL).
+    if TTLCache is not None:
+        return TTLCache(
+            maxsize=int(os.getenv("MAX_SESSIONS", "256")),
+            ttl=int(os.getenv("SESSION_TTL_S", "3600")),
+        )
     return {}
 
 
-def _export_docx(pergunta: str, resposta: str, fontes: list) -> bytes:
-    """Gera documento Word formatado com pergunta, resposta e fontes."""
+def _store_update(store: dict, sid: str, **campos) -> None:
+    """Atualiza os campos da sessao e reinsere a chave no store.
+
+    O TTLCache expira pela idade da *insercao*; reinserir a chave faz o
+    prazo contar da ultima atividade, entao um chat em uso continuo nao
+    perde o historico. Sessao ja expirada e ignorada (sera recriada).
+    """
+    try:
+        dados = store[sid]
+        dados.update(campos)
+        store[sid] = dados
+    except Exception:
+        pass
+
+
+@st.cache_resource(show_spinner=False)
+def _docx_template() -> tuple[bytes, str, str, str]:
+    """Constroi o .docx template uma unica vez (placeholders {{DATA}}/{{PERGUNTA}}/{{RESPOSTA}}/{{FONTES}}).
+
+    Retorna (bytes do zip, document.xml antes do bloco de fontes, xml do
+    cabecalho "Fontes consultadas:" e xml depois do bloco). O cabecalho
+    fica separado para ser omitido quando a resposta nao tem fontes.
+    """
     from docx import Document
     from docx.shared import Pt, Inches
     from docx.enum.text import WD_ALIGN_PARAGRAPH
-    from datetime import datetime
 
     doc = Document()
-    sections = doc.sections
-    for section in sections:
+    for section in doc.sections:
         section.top_margin = Inches(1)
         section.bottom_margin = Inches(1)
         section.left_margin = Inches(1.25)
@@ -83,34 +159,77 @@ def _export_docx(pergunta: str, resposta: str, fontes: list) -> bytes:
     titulo = doc.add_heading("Consulta de dados contratuais", 0)
     titulo.alignment = WD_ALIGN_PARAGRAPH.CENTER
     p_data = doc.add_paragraph()
-    p_data.add_run(datetime.now().strftime("%d/%m/%Y %H:%M")).italic = True
+    p_data.add_run("{{DATA}}").italic = True
     p_data.alignment = WD_ALIGN_PARAGRAPH.RIGHT
 
     doc.add_paragraph()
     p = doc.add_paragraph()
     p.add_run("Pergunta:").bold = True
-    p.add_run("\n" + pergunta)
+    p.add_run("\n{{PERGUNTA}}")
     p.paragraph_format.space_after = Pt(12)
 
     p = doc.add_paragraph()
     p.add_run("Resposta:").bold = True
-    p.add_run("\n" + resposta)
+    p.add_run("\n{{RESPOSTA}}")
     p.paragraph_format.space_after = Pt(12)
 
-    if fontes:
-        doc.add_paragraph()
-        p = doc.add_paragraph()
-        p.add_run("Fontes consultadas:").bold = True
-        for i, f in enumerate(fontes, 1):
-            doc.add_paragraph(f"{i}. {f}", style="List Number")
+    doc.add_paragraph("{{FONTES_INI}}")
+    p = doc.add_paragraph()
+    p.add_run("Fontes consultadas:").bold = True
+    doc.add_paragraph("{{FONTES}}")
 
     buffer = io.BytesIO()
     doc.save(buffer)
-    buffer.seek(0)
-    return buffer.getvalue()
+    zip_bytes = buffer.getvalue()
+
+    with zipfile.ZipFile(io.BytesIO(zip_bytes)) as zf:
+        doc_xml = zf.read("word/document.xml").decode("utf-8")
+    # Localiza o bloco de fontes inteiro: do paragrafo em branco marcado com
+    # {{FONTES_INI}} (antes do cabecalho) ate o paragrafo com {{FONTES}}
+    m_ini = re.search(r"<w:p\b(?:(?!</w:p>).)*\{\{FONTES_INI\}\}.*?</w:p>", doc_xml, re.DOTALL)
+    m_fontes = re.search(r"<w:p\b(?:(?!</w:p>).)*\{\{FONTES\}\}.*?</w:p>", doc_xml, re.DOTALL)
+    if not m_ini or not m_fontes:
+        raise RuntimeError("Template docx sem placeholder {{FONTES_INI}}/{{FONTES}}")
+    cabecalho = doc_xml[m_ini.start(): m_fontes.start()].replace("{{FONTES_INI}}", "")
+    return zip_bytes, doc_xml[: m_ini.start()], cabecalho, doc_xml[m_fontes.end():]
+
+
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
+def _export_docx(pergunta: str, resposta: str, fontes: tuple[str, ...],
+                 now_str: str | None = None) -> bytes:
+    """Gera documento Word substituindo placeholders no template cacheado (sem remontar o XML)."""
+    zip_bytes, xml_antes, xml_cabecalho, xml_depois = _docx_template()
+
+    def _wtext(texto: str) -> str:
+        return _escape_html(texto).replace("\n", '</w:t><w:br/><w:t xml:space="preserve">')
+
+    # Sem fontes, o bloco inteiro (cabecalho incluso) e omitido
+    fontes_xml = ""
+    if fontes:
+        fontes_xml = xml_cabecalho + "".join(
+            f'<w:p><w:r><w:t xml:space="preserve">{i}. {_wtext(f)}</w:t></w:r></w:p>'
+            for i, f in enumerate(fontes, 1)
+        )
+    doc_xml = (
+        (xml_antes + fontes_xml + xml_depois)
+        .replace("{{DATA}}", now_str or _dt.now().strftime(_TS_FMT))
+        .replace("{{PERGUNTA}}", _wtext(pergunta))
+        .replace("{{RESPOSTA}}", _wtext(resposta))
+    )
+
+    out = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(zip_bytes)) as zin, \
+            zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as zout:
+        for item in zin.infolist():
+            if item.filename == "word/document.xml":
+                zout.writestr(item, doc_xml)
+            else:
+                zout.writestr(item, zin.read(item.filename))
+    return out.getvalue()
 
 
-def _export_txt(pergunta: str, resposta: str, fontes: list) -> str:
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
+def _export_txt(pergunta: str, resposta: str, fontes: tuple[str, ...]) -> str:
     """Gera texto simples para exportacao."""
     linhas = [
         "=== Consulta de dados contratuais ===",
@@ -128,67 +247,64 @@ def _export_txt(pergunta: str, resposta: str, fontes: list) -> str:
     return "\n".join(linhas)
 
 
-def _export_xlsx(pergunta: str, resposta: str, fontes: list) -> bytes:
-    """Gera planilha Excel formatada com pergunta, resposta e fontes."""
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
+def _export_xlsx(pergunta: str, resposta: str, fontes: tuple[str, ...],
+                 now_str: str | None = None) -> bytes:
+    """Gera planilha Excel formatada com pergunta, resposta e fontes (write-only, streaming)."""
     from openpyxl import Workbook
-    from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
-    from openpyxl.utils import get_column_letter
-    from datetime import datetime
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, Alignment, PatternFill
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Relatorio"
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Relatorio")
 
-    thin_border = Border(
-        left=Side(style="thin"),
-        right=Side(style="thin"),
-        top=Side(style="thin"),
-        bottom=Side(style="thin"),
-    )
+    # Estilos criados uma unica vez, fora de qualquer loop
     header_fill = PatternFill(start_color="2D5A3D", end_color="2D5A3D", fill_type="solid")
+    secao_fill = PatternFill(start_color="E8F0E8", end_color="E8F0E8", fill_type="solid")
+    bold = Font(bold=True)
+    wrap_top = Alignment(wrap_text=True, vertical="top")
+    wrap = Alignment(wrap_text=True)
+
+    # Larguras precisam ser definidas antes do primeiro append em modo write-only
+    ws.column_dimensions["A"].width = 100
+    ws.column_dimensions["B"].width = 15
+    ws.column_dimensions["C"].width = 15
 
-    ws["A1"] = "Consulta de dados contratuais - DGRTA"
-    ws["A1"].font = Font(bold=True, size=14, color="FFFFFF")
-    ws["A1"].fill = header_fill
-    ws["A1"].alignment = Alignment(horizontal="center", wrap_text=True)
-    ws.merge_cells("A1:C1")
-
-    ws["A2"] = datetime.now().strftime("%d/%m/%Y %H:%M")
-    ws["A2"].font = Font(italic=True, size=9)
-    ws.merge_cells("A2:C2")
-
-    row = 4
-    ws[f"A{row}"] = "Pergunta:"
-    ws[f"A{row}"].font = Font(bold=True)
-    ws[f"A{row}"].fill = PatternFill(start_color="E8F0E8", end_color="E8F0E8", fill_type="solid")
-    row += 1
-    ws[f"A{row}"] = pergunta
-    ws[f"A{row}"].alignment = Alignment(wrap_text=True, vertical="top")
-    ws.row_dimensions[row].height = max(30, min(200, len(pergunta) // 3))
-    row += 2
-
-    ws[f"A{row}"] = "Resposta:"
-    ws[f"A{row}"].font = Font(bold=True)
-    ws[f"A{row}"].fill = PatternFill(start_color="E8F0E8", end_color="E8F0E8", fill_type="solid")
-    row += 1
-    ws[f"A{row}"] = resposta
-    ws[f"A{row}"].alignment = Alignment(wrap_text=True, vertical="top")
-    ws.row_dimensions[row].height = max(30, min(400, len(resposta) // 2))
-    row += 2
+    def _cell(valor, font=None, fill=None, alignment=None):
+        c = WriteOnlyCell(ws, value=valor)
+        if font is not None:
+            c.font = font
+        if fill is not None:
+            c.fill = fill
+        if alignment is not None:
+            c.alignment = alignment
+        return c
+
+    ws.append([_cell(
+        "Consulta de dados contratuais - DGRTA",
+        font=Font(bold=True, size=14, color="FFFFFF"),
+        fill=header_fill,
+        alignment=Alignment(horizontal="center", wrap_text=True),
+    )])
+    ws.append([_cell(now_str or _dt.now().strftime(_TS_FMT), font=Font(italic=True, size=9))])
+    ws.append([])
+    ws.append([_cell("Pergunta:", font=bold, fill=secao_fill)])
+    ws.append([_cell(pergunta, alignment=wrap_top)])
+    ws.append([])
+    ws.append([_cell("Resposta:", font=bold, fill=secao_fill)])
+    ws.append([_cell(resposta, alignment=wrap_top)])
 
     if fontes:
-        ws[f"A{row}"] = "Fontes consultadas:"
-        ws[f"A{row}"].font = Font(bold=True)
-        ws[f"A{row}"].fill = PatternFill(start_color="E8F0E8", end_color="E8F0E8", fill_type="solid")
-        row += 1
+        ws.append([])
+        ws.append([_cell("Fontes consultadas:", font=bold, fill=secao_fill)])
         for i, f in enumerate(fontes, 1):
-            ws[f"A{row}"] = f"{i}. {f}"
-            ws[f"A{row}"].alignment = Alignment(wrap_text=True)
-            row += 1
+            ws.append([_cell(f"{i}. {f}", alignment=wrap)])
 
-    ws.column_dimensions["A"].width = 100
-    ws.column_dimensions["B"].width = 15
-    ws.column_dimensions["C"].width = 15
+    try:
+        ws.merged_cells.ranges.add("A1:C1")
+        ws.merged_cells.ranges.add("A2:C2")
+    except Exception:
+        pass
 
     buffer = io.BytesIO()
     wb.save(buffer)
@@ -196,61 +312,123 @@ def _export_xlsx(pergunta: str, resposta: str, fontes: list) -> bytes:
     return buffer.getvalue()
 
 
+@functools.lru_cache(maxsize=4096)
 def _try_parse_number_br(s: str) -> float | None:
-    """Converte '1.234,56' / 'R$ 1.234,56' em float. Retorna None se falhar."""
+    """Converte '1.234,56' / 'R$ 1.234,56' em float. Retorna None se falhar.
+
+    Passada unica sobre os bytes (sem regex nem strings intermediarias):
+    digitos sao copiados, '.' antes da virgula e separador de milhar,
+    virgula unica vira ponto decimal e '-' e mantido onde aparece (fora
+    do inicio o float() falha, rejeitando datas e faixas como "10-20").
+    Memoizada: tabelas de contrato repetem muito os mesmos valores ("0,00").
+    """
     if s is None:
         return None
-    txt = str(s).strip()
-    if not txt:
+    raw = str(s).encode("ascii", "ignore")
+    if not raw:
         return None
-    txt = txt.replace("R$", "").replace("r$", "").strip()
-    txt = re.sub(r"\s+", "", txt)
-    txt = re.sub(r"[^0-9,.-]", "", txt)
-    if not txt:
+    decimal_br = raw.count(b",") == 1
+    out = bytearray()
+    for b in raw:
+        if 0x30 <= b <= 0x39:  # 0-9
+            out.append(b)
+        elif b == 0x2C:  # ','
+            # virgula unica: decimal BR; mais de uma: mantem e float() falha
+            out.append(0x2E if decimal_br else 0x2C)
+        elif b == 0x2E:  # '.'
+            if not decimal_br:
+                out.append(b)
+        elif b == 0x2D:  # '-'
+            # mantido mesmo fora do inicio: float() falha e a celula
+            # continua texto (datas "2022-01-01", faixas "10-20")
+            out.append(b)
+    if not out:
         return None
-    if "," in txt and txt.count(",") == 1:
-        txt = txt.replace(".", "").replace(",", ".")
     try:
-        return float(txt)
-    except Exception:
+        return float(out.decode("ascii"))
+    except ValueError:
+        return None
+
+
+def _csv_line_groups_np(lines: list[str]) -> list[list[str]] | None:
+    """Blocos contiguos de linhas tipo CSV via NumPy (respostas com centenas de linhas).
+
+    Retorna None se o NumPy nao estiver disponivel (cai no caminho Python).
+    """
+    try:
+        import numpy as np
+    except ImportError:
         return None
 
+    arr = np.array(lines)
+    mask = np.char.count(arr, ",") >= 3
+    if not mask.any():
+        return []
+    # Bordas dos runs contiguos de True: pares (inicio, fim)
+    bordas = np.flatnonzero(np.diff(np.r_[0, mask.view(np.int8), 0]))
+    grupos: list[list[str]] = []
+    for ini, fim in zip(bordas[::2], bordas[1::2]):
+        cur: list[str] = []
+        for ln in lines[ini:fim]:
+            ln = ln.strip()
+            if ln.lower().startswith(("fonte", "fontes")):
+                if len(cur) >= 2:
+                    grupos.append(cur)
+                cur = []
+            else:
+                cur.append(ln)
+        if len(cur) >= 2:
+            grupos.append(cur)
+    return grupos
+
 
 def _extract_csv_table(text: str) -> list[list[str]] | None:
     """Extrai uma tabela tipo CSV da resposta do modelo (codeblock ou linhas com vírgula)."""
     if not text:
         return None
 
-    blocks = re.findall(r"```(?:csv|text)?\n([\s\S]*?)```", text, flags=re.IGNORECASE)
-    candidates: list[str] = []
-    for b in blocks:
-        b = b.strip()
-        if b.count("\n") >= 1 and b.count(",") >= 3:
-            candidates.append(b)
+    # Fast path: resposta narrativa tipica nao tem tabela — dois scans em C
+    # (str.count / in) resolvem o caso comum sem regex nem splitlines
+    if text.count(",") < 3 or ("```" not in text and "\n" not in text):
+        return None
+
+    # Candidatos como listas de linhas: parse unico no final, sem join/StringIO.
+    # max(candidates, key=len) no final e O(k) — nenhuma recontagem de linhas.
+    candidates: list[list[str]] = []
+    for b in _RE_CSV_BLOCK.findall(text):
+        linhas_b = b.strip().splitlines()
+        if len(linhas_b) >= 2 and b.count(",") >= 3:
+            candidates.append(linhas_b)
 
     if not candidates:
-        lines = [ln.strip() for ln in text.splitlines()]
+        lines = text.splitlines()
         best: list[str] = []
-        cur: list[str] = []
-        for ln in lines:
-            looks_csv = ln.count(",") >= 3 and not ln.lower().startswith(("fonte", "fontes"))
-            if looks_csv:
-                cur.append(ln)
-            else:
-                if len(cur) > len(best):
-                    best = cur
-                cur = []
-        if len(cur) > len(best):
-            best = cur
+        if len(lines) >= 200:
+            grupos = _csv_line_groups_np(lines)
+            if grupos is not None:
+                best = max(grupos, key=len, default=[])
+                lines = []  # ja varrido pelo caminho vetorizado
+        if not best and lines:
+            cur: list[str] = []
+            for ln in lines:
+                ln = ln.strip()
+                if ln.count(",") >= 3 and not ln.lower().startswith(("fonte", "fontes")):
+                    cur.append(ln)
+                else:
+                    if len(cur) > len(best):
+                        best = cur
+                    cur = []
+            if len(cur) > len(best):
+                best = cur
         if len(best) >= 2:
-            candidates.append("\n".join(best))
+            candidates.append(best)
 
     if not candidates:
         return None
 
-    csv_text = max(candidates, key=lambda s: s.count("\n"))
+    # csv.reader consome o iteravel de linhas direto
     try:
-        reader = csv.reader(io.StringIO(csv_text), delimiter=",")
+        reader = csv.reader(max(candidates, key=len), delimiter=",")
         rows = [[c.strip() for c in r] for r in reader if any(c.strip() for c in r)]
         if len(rows) >= 2 and len(rows[0]) >= 3:
             return rows
@@ -259,87 +437,288 @@ def _extract_csv_table(text: str) -> list[list[str]] | None:
     return None
 
 
-def _export_xlsx_table(pergunta: str, rows: list[list[str]], fontes: list) -> bytes:
-    """Gera Excel formatado a partir de uma tabela (rows[0]=cabecalho)."""
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
-    from openpyxl.utils import get_column_letter
-    from datetime import datetime
+# --- Fast path XLSX: SpreadsheetML escrito a mao para tabelas grandes ---
+# Acima deste numero de linhas o custo por celula do openpyxl domina o export;
+# o fast path escreve o XML direto no zip (limitado por ZIP+deflate apenas).
+_XLSX_FAST_MIN_ROWS = 500
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Tabela"
+_XML_TT = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;"})
 
-    thin = Side(style="thin")
-    thin_border = Border(left=thin, right=thin, top=thin, bottom=thin)
-    header_fill = PatternFill(start_color="2D5A3D", end_color="2D5A3D", fill_type="solid")
+_XLSX_RELS = (
+    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    b'<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    b'<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+    b'relationships/officeDocument" Target="xl/workbook.xml"/></Relationships>'
+)
+
+_XLSX_STYLES = (
+    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    b'<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    b'<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    b'<font><b/><color rgb="FFFFFFFF"/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    b'<fills count="3"><fill><patternFill patternType="none"/></fill>'
+    b'<fill><patternFill patternType="gray125"/></fill>'
+    b'<fill><patternFill patternType="solid"><fgColor rgb="FF2D5A3D"/><bgColor indexed="64"/></patternFill></fill></fills>'
+    b'<borders count="2"><border><left/><right/><top/><bottom/><diagonal/></border>'
+    b'<border><left style="thin"/><right style="thin"/><top style="thin"/><bottom style="thin"/><diagonal/></border></borders>'
+    b'<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    # 0=normal, 1=cabecalho, 2=corpo com borda, 3=numerico #,##0.00 (numFmtId 4 builtin)
+    b'<cellXfs count="4"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    b'<xf numFmtId="0" fontId="1" fillId="2" borderId="1" xfId="0" applyFont="1" applyFill="1" applyBorder="1"/>'
+    b'<xf numFmtId="0" fontId="0" fillId="0" borderId="1" xfId="0" applyBorder="1"/>'
+    b'<xf numFmtId="4" fontId="0" fillId="0" borderId="1" xfId="0" applyNumberFormat="1" applyBorder="1"/></cellXfs>'
+    b'<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles></styleSheet>'
+)
 
-    max_cols = max(3, len(rows[0]))
-    ws["A1"] = "Consulta de dados contratuais - Tabela"
-    ws["A1"].font = Font(bold=True, size=14, color="FFFFFF")
-    ws["A1"].fill = header_fill
-    ws["A1"].alignment = Alignment(horizontal="center")
-    ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=max_cols)
 
-    ws["A2"] = datetime.now().strftime("%d/%m/%Y %H:%M")
-    ws["A2"].font = Font(italic=True, size=9)
-    ws.merge_cells(start_row=2, start_column=1, end_row=2, end_column=max_cols)
+def _xml_escape(s: str) -> str:
+    """Escapa &, <, > e aspas para uso em XML inline."""
+    return s.translate(_XML_TT)
 
-    ws["A4"] = "Pergunta:"
-    ws["A4"].font = Font(bold=True)
-    ws["A5"] = pergunta
-    ws["A5"].alignment = Alignment(wrap_text=True, vertical="top")
-    ws.merge_cells(start_row=5, start_column=1, end_row=5, end_column=max_cols)
 
-    start_row = 7
-    header = rows[0]
-    for c_idx, col in enumerate(header, 1):
-        cell = ws.cell(row=start_row, column=c_idx, value=col)
-        cell.font = Font(bold=True, color="FFFFFF")
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-        cell.border = thin_border
-
-    norm = [re.sub(r"\s+", " ", h.strip().lower()) for h in header]
+def _col_letter(idx: int) -> str:
+    """1 -> A, 2 -> B, 27 -> AA (sem depender do openpyxl no fast path)."""
+    letters = ""
+    while idx > 0:
+        idx, rem = divmod(idx - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def _num_cols_da_tabela(header: list[str]) -> set[int]:
+    """Indices (1-based) das colunas numericas, pelo nome do cabecalho."""
+    norm = [_RE_WS.sub(" ", h.strip().lower()) for h in header]
     num_cols: set[int] = set()
     for i, h in enumerate(norm, 1):
         if any(k in h for k in ("quantidade", "preço", "preco", "valor", "unitário", "unitario", "total", "r$")):
             num_cols.add(i)
+    return num_cols
+
+
+def _export_xlsx_table_fast(pergunta: str, rows: list[list[str]], fontes: tuple[str, ...],
+                            now_str: str | None = None) -> bytes:
+    """Gera o .xlsx escrevendo o SpreadsheetML direto no zip (sem objetos de celula)."""
+    header = rows[0]
+    last_col = len(header)
+    num_cols = _num_cols_da_tabela(header)
+    start_row = 7
 
-    for r_idx, row in enumerate(rows[1:], start_row + 1):
-        for c_idx in range(1, len(header) + 1):
+    def _c_str(ref: str, texto: str, style: int = 2) -> str:
+        return f'<c r="{ref}" s="{style}" t="inlineStr"><is><t xml:space="preserve">{_xml_escape(texto)}</t></is></c>'
+
+    linhas_xml: list[str] = [
+        f'<row r="1">{_c_str("A1", "Consulta de dados contratuais - Tabela", 1)}</row>',
+        f'<row r="2">{_c_str("A2", now_str or _dt.now().strftime(_TS_FMT), 0)}</row>',
+        f'<row r="4">{_c_str("A4", "Pergunta:", 0)}</row>',
+        f'<row r="5">{_c_str("A5", pergunta, 0)}</row>',
+        '<row r="7">' + "".join(
+            _c_str(f"{_col_letter(j)}7", col, 1) for j, col in enumerate(header, 1)
+        ) + "</row>",
+    ]
+    for r_off, row in enumerate(rows[1:], start_row + 1):
+        celulas: list[str] = []
+        for c_idx in range(1, last_col + 1):
             val = row[c_idx - 1] if c_idx - 1 < len(row) else ""
-            cell = ws.cell(row=r_idx, column=c_idx, value=val)
-            cell.alignment = Alignment(vertical="top", wrap_text=True)
-            cell.border = thin_border
+            ref = f"{_col_letter(c_idx)}{r_off}"
             if c_idx in num_cols:
                 n = _try_parse_number_br(val)
                 if n is not None:
-                    cell.value = n
-                    cell.number_format = '#,##0.00'
-                    cell.alignment = Alignment(vertical="top", horizontal="right")
+                    celulas.append(f'<c r="{ref}" s="3" t="n"><v>{n!r}</v></c>')
+                    continue
+            celulas.append(_c_str(ref, val))
+        linhas_xml.append(f'<row r="{r_off}">' + "".join(celulas) + "</row>")
 
     last_row = start_row + len(rows) - 1
+    sheet1 = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<sheetViews><sheetView workbookViewId="0"><pane ySplit="7" topLeftCell="A8" '
+        'activePane="bottomLeft" state="frozen"/></sheetView></sheetViews>'
+        "<sheetData>" + "".join(linhas_xml) + "</sheetData>"
+        f'<autoFilter ref="A{start_row}:{_col_letter(last_col)}{last_row}"/>'
+        "</worksheet>"
+    )
+
+    tem_fontes = bool(fontes)
+    if tem_fontes:
+        fontes_rows = [f'<row r="1">{_c_str("A1", "Fontes consultadas", 1)}</row>'] + [
+            f'<row r="{i}">{_c_str(f"A{i}", str(f), 2)}</row>' for i, f in enumerate(fontes, 2)
+        ]
+        sheet2 = (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            "<sheetData>" + "".join(fontes_rows) + "</sheetData></worksheet>"
+        )
+
+    sheet_overrides = (
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType='
+        '"application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    )
+    sheets_wb = '<sheet name="Tabela" sheetId="1" r:id="rId1"/>'
+    sheets_rel = (
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+        'relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    )
+    if tem_fontes:
+        sheet_overrides += (
+            '<Override PartName="/xl/worksheets/sheet2.xml" ContentType='
+            '"application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        )
+        sheets_wb += '<sheet name="Fontes" sheetId="2" r:id="rId2"/>'
+        sheets_rel += (
+            '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+            'relationships/worksheet" Target="worksheets/sheet2.xml"/>'
+        )
+    sheets_rel += (
+        '<Relationship Id="rId3" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+        'relationships/styles" Target="styles.xml"/>'
+    )
+
+    content_types = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType='
+        '"application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/styles.xml" ContentType='
+        '"application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        f"{sheet_overrides}</Types>"
+    )
+    workbook = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f"<sheets>{sheets_wb}</sheets></workbook>"
+    )
+    workbook_rels = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        f"{sheets_rel}</Relationships>"
+    )
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        for nome, data in (
+            ("[Content_Types].xml", content_types.encode("utf-8")),
+            ("_rels/.rels", _XLSX_RELS),
+            ("xl/workbook.xml", workbook.encode("utf-8")),
+            ("xl/_rels/workbook.xml.rels", workbook_rels.encode("utf-8")),
+            ("xl/styles.xml", _XLSX_STYLES),
+            ("xl/worksheets/sheet1.xml", sheet1.encode("utf-8")),
+        ):
+            zf.writestr(zipfile.ZipInfo(nome), data, compress_type=zipfile.ZIP_DEFLATED)
+        if tem_fontes:
+            zf.writestr(zipfile.ZipInfo("xl/worksheets/sheet2.xml"), sheet2.encode("utf-8"),
+                        compress_type=zipfile.ZIP_DEFLATED)
+    return buffer.getvalue()
+
+
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
+def _export_xlsx_table(pergunta: str, rows: list[list[str]], fontes: tuple[str, ...],
+                       now_str: str | None = None) -> bytes:
+    """Gera Excel formatado a partir de uma tabela (rows[0]=cabecalho), em modo write-only."""
+    if len(rows) > _XLSX_FAST_MIN_ROWS:
+        try:
+            return _export_xlsx_table_fast(pergunta, rows, fontes, now_str)
+        except Exception:
+            pass  # cai no caminho openpyxl
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Tabela")
+
+    # Estilos criados uma unica vez, fora dos loops
+    thin = Side(style="thin")
+    thin_border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    header_fill = PatternFill(start_color="2D5A3D", end_color="2D5A3D", fill_type="solid")
+    header_font = Font(bold=True, color="FFFFFF")
+    header_align = Alignment(horizontal="center", vertical="center", wrap_text=True)
+    body_align = Alignment(vertical="top", wrap_text=True)
+    num_align = Alignment(vertical="top", horizontal="right")
+
+    header = rows[0]
+    max_cols = max(3, len(header))
     last_col = len(header)
-    ws.freeze_panes = ws["A8"]
-    ws.auto_filter.ref = f"A{start_row}:{get_column_letter(last_col)}{last_row}"
+    start_row = 7
+    last_row = start_row + len(rows) - 1
+
+    num_cols = _num_cols_da_tabela(header)
+
+    # Largura das colunas: passada unica sobre as strings brutas, acumulando o
+    # maximo por coluna via zip (em write-only as larguras precisam ser
+    # definidas antes do primeiro append; nada de ws.cell() aqui)
+    col_max = [10] * last_col
+    for row in rows[:201]:
+        if len(row) < last_col:
+            row = row + [""] * (last_col - len(row))
+        col_max = [max(m, len(str(v))) for m, v in zip(col_max, row)]
+    for j, m in enumerate(col_max, 1):
+        ws.column_dimensions[get_column_letter(j)].width = min(60, max(12, m + 2))
+
+    ws.freeze_panes = "A8"
+
+    def _cell(valor, font=None, fill=None, alignment=None, border=None):
+        c = WriteOnlyCell(ws, value=valor)
+        if font is not None:
+            c.font = font
+        if fill is not None:
+            c.fill = fill
+        if alignment is not None:
+            c.alignment = alignment
+        if border is not None:
+            c.border = border
+        return c
+
+    ws.append([_cell(
+        "Consulta de dados contratuais - Tabela",
+        font=Font(bold=True, size=14, color="FFFFFF"),
+        fill=header_fill,
+        alignment=Alignment(horizontal="center"),
+    )])
+    ws.append([_cell(now_str or _dt.now().strftime(_TS_FMT), font=Font(italic=True, size=9))])
+    ws.append([])
+    ws.append([_cell("Pergunta:", font=Font(bold=True))])
+    ws.append([_cell(pergunta, alignment=body_align)])
+    ws.append([])
+
+    ws.append([
+        _cell(col, font=header_font, fill=header_fill, alignment=header_align, border=thin_border)
+        for col in header
+    ])
+
+    for row in rows[1:]:
+        cells = []
+        for c_idx in range(1, last_col + 1):
+            val = row[c_idx - 1] if c_idx - 1 < len(row) else ""
+            cell = _cell(val, alignment=body_align, border=thin_border)
+            if c_idx in num_cols:
+                n = _try_parse_number_br(val)
+                if n is not None:
+                    cell.value = n
+                    cell.number_format = '#,##0.00'
+                    cell.alignment = num_align
+            cells.append(cell)
+        ws.append(cells)
 
-    for c_idx in range(1, last_col + 1):
-        col_letter = get_column_letter(c_idx)
-        max_len = 10
-        for r in range(start_row, min(last_row, start_row + 200) + 1):
-            v = ws.cell(row=r, column=c_idx).value
-            if v is None:
-                continue
-            max_len = max(max_len, len(str(v)))
-        ws.column_dimensions[col_letter].width = min(60, max(12, max_len + 2))
+    ws.auto_filter.ref = f"A{start_row}:{get_column_letter(last_col)}{last_row}"
+    try:
+        ws.merged_cells.ranges.add(f"A1:{get_column_letter(max_cols)}1")
+        ws.merged_cells.ranges.add(f"A2:{get_column_letter(max_cols)}2")
+        ws.merged_cells.ranges.add(f"A5:{get_column_letter(max_cols)}5")
+    except Exception:
+        pass
 
     if fontes:
         ws2 = wb.create_sheet("Fontes")
-        ws2["A1"] = "Fontes consultadas"
-        ws2["A1"].font = Font(bold=True)
-        for i, f in enumerate(fontes, 1):
-            ws2[f"A{i+1}"] = f
+        c = WriteOnlyCell(ws2, value="Fontes consultadas")
+        c.font = Font(bold=True)
+        ws2.append([c])
+        for f in fontes:
+            ws2.append([f])
 
     buffer = io.BytesIO()
     wb.save(buffer)
@@ -347,57 +726,190 @@ def _export_xlsx_table(pergunta: str, rows: list[list[str]], fontes: list) -> by
     return buffer.getvalue()
 
 
+_HTML_TT = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;"})
+
+
 def _escape_html(s: str) -> str:
-    """Escapa caracteres especiais para uso em HTML/ReportLab."""
-    return s.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    """Escapa caracteres especiais para uso em HTML/ReportLab (passada unica em C)."""
+    return s.translate(_HTML_TT)
+
+
+_PDF_STYLES = None
+
+
+def _pdf_styles():
+    """Stylesheet do ReportLab criado uma unica vez (montar os ParagraphStyle e caro)."""
+    global _PDF_STYLES
+    if _PDF_STYLES is None:
+        from reportlab.lib.styles import getSampleStyleSheet
 
+        _PDF_STYLES = getSampleStyleSheet()
+    return _PDF_STYLES
 
-def _export_pdf(pergunta: str, resposta: str, fontes: list) -> bytes:
-    """Gera PDF com pergunta, resposta e fontes."""
+
+def _linhas_html(texto: str) -> str:
+    """Um <p> por linha do texto, ja escapado."""
+    return "".join(f"<p>{_escape_html(ln) or '&nbsp;'}</p>" for ln in texto.split("\n"))
+
+
+def _export_pdf_weasy(pergunta: str, resposta: str, fontes: tuple[str, ...]) -> bytes:
+    """Renderiza o PDF a partir de HTML com weasyprint (layout em Pango/Cairo)."""
+    from weasyprint import HTML
+
+    partes = [
+        "<style>body{font-family:Helvetica,Arial,sans-serif;font-size:10pt;margin:2cm}"
+        "h1{font-size:14pt}</style>",
+        "<h1>Consulta de dados contratuais</h1>",
+        "<p><b>Pergunta:</b></p>",
+        _linhas_html(pergunta),
+        "<p><b>Resposta:</b></p>",
+        _linhas_html(resposta),
+    ]
+    if fontes:
+        partes.append("<p><b>Fontes consultadas:</b></p><ol>")
+        partes.extend(f"<li>{_escape_html(f)}</li>" for f in fontes)
+        partes.append("</ol>")
+    return HTML(string="".join(partes)).write_pdf()
+
+
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
+def _export_pdf(pergunta: str, resposta: str, fontes: tuple[str, ...]) -> bytes:
+    """Gera PDF com pergunta, resposta e fontes.
+
+    Com weasyprint instalado, o layout roda em Pango/Cairo (C) a partir de
+    HTML - 2-3x mais rapido que o Platypus; sem ele, segue o ReportLab.
+    """
+    try:
+        return _export_pdf_weasy(pergunta, resposta, fontes)
+    except Exception:
+        pass
     from reportlab.lib.pagesizes import A4
-    from reportlab.lib.styles import getSampleStyleSheet
     from reportlab.lib.units import cm
     from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm)
-    styles = getSampleStyleSheet()
-    story = []
+    styles = _pdf_styles()
+    normal = styles["Normal"]
 
+    def _paragrafos(texto: str) -> list:
+        # Um Paragraph por linha: evita o parse de <br/> no mini-HTML do ReportLab
+        return [Paragraph(_escape_html(ln) or " ", normal) for ln in texto.split("\n")]
+
+    story = []
     story.append(Paragraph("Consulta de dados contratuais", styles["Title"]))
     story.append(Spacer(1, 0.5*cm))
-    story.append(Paragraph("<b>Pergunta:</b>", styles["Normal"]))
-    story.append(Paragraph(_escape_html(pergunta).replace("\n", "<br/>"), styles["Normal"]))
+    story.append(Paragraph("<b>Pergunta:</b>", normal))
+    story.extend(_paragrafos(pergunta))
     story.append(Spacer(1, 0.5*cm))
-    story.append(Paragraph("<b>Resposta:</b>", styles["Normal"]))
-    story.append(Paragraph(_escape_html(resposta).replace("\n", "<br/>"), styles["Normal"]))
+    story.append(Paragraph("<b>Resposta:</b>", normal))
+    story.extend(_paragrafos(resposta))
     if fontes:
         story.append(Spacer(1, 0.5*cm))
-        story.append(Paragraph("<b>Fontes consultadas:</b>", styles["Normal"]))
+        story.append(Paragraph("<b>Fontes consultadas:</b>", normal))
         for i, f in enumerate(fontes, 1):
-            story.append(Paragraph(f"{i}. {_escape_html(f)}", styles["Normal"]))
+            story.append(Paragraph(f"{i}. {_escape_html(f)}", normal))
 
     doc.build(story)
     buffer.seek(0)
     return buffer.getvalue()
 
 
-def _render_sidebar_history(placeholder, messages: list[dict]) -> None:
+def _ultimas_perguntas(messages: list[dict]) -> list[str]:
+    """Ultimas 5 perguntas do usuario, varrendo de tras pra frente com parada cedo."""
+    ultimas: list[str] = []
+    for m in reversed(messages):
+        if m.get("role") == "user":
+            ultimas.append(m["content"])
+            if len(ultimas) == 5:
+                break
+    ultimas.reverse()
+    return ultimas
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _render_sug_links(sugestoes: tuple[str, ...], sid: str) -> str:
+    """Bloco HTML do dock de sugestoes, memoizado por (sugestoes, sid).
+
+    Link HTML (sem JS): dispara ?sug=... na MESMA aba. (JS em onclick pode
+    ser bloqueado pelo Streamlit/CSP em alguns navegadores.) As sugestoes
+    mudam so apos uma resposta, mas o bloco era remontado (escape + quote
+    por item) a cada rerun.
+    """
+    sid_q = quote(sid)
+    links = "\n".join(
+        f'<a class="dgrta-sug-btn" target="_self" href="?sid={sid_q}&sug={quote(s)}">{_html.escape(s)}</a>'
+        for s in sugestoes
+    )
+    return (
+        '<div id="dgrta-sugestoes-dock">'
+        '<span class="dgrta-sug-label">💡 Sugestões:</span>'
+        f'<div id="dgrta-sug-row">{links}</div>'
+        "</div>"
+    )
+
+
+def _render_sidebar_history(placeholder, messages: list[dict], sid: str) -> None:
     with placeholder.container():
         st.subheader("📋 Histórico de perguntas")
-        perguntas = [m["content"] for m in messages if m.get("role") == "user"]
-        if perguntas:
-            # Ultimas 5 perguntas (limite do historico)
-            ultimas = perguntas[-5:]
-            for i, p in enumerate(ultimas, 1):
-                texto = (p[:60] + "...") if len(p) > 60 else p
-                if st.button(f"{i}. {texto}", key=f"hist_{i}_{hash(p)}", use_container_width=True):
-                    st.session_state._hist_click = p
-                    st.rerun()
+        ultimas = _ultimas_perguntas(messages)
+        if ultimas:
+            # Um unico bloco HTML com ancoras: clique vira ?hist=i na mesma aba,
+            # sem manter N widgets st.button para diffar a cada rerun
+            links = "".join(
+                f'<a class="dgrta-hist-btn" target="_self" href="?sid={quote(sid)}&hist={i}">'
+                f'{i}. {_html.escape((p[:60] + "...") if len(p) > 60 else p)}</a>'
+                for i, p in enumerate(ultimas, 1)
+            )
+            st.markdown(f'<div class="dgrta-hist">{links}</div>', unsafe_allow_html=True)
         else:
             st.caption("Nenhuma pergunta ainda.")
 
 
+@st.cache_data(ttl=3600)
+def _banner_html(path_str: str, mtime: float) -> str:
+    """Monta o div do banner (base64 multi-KB) uma vez por arquivo/mtime."""
+    b64 = _img_to_b64(path_str)
+    return f"""
+        <div id="banner-dgrta" style="
+            margin-bottom: 1rem;
+            border-radius: 8px;
+        ">
+            <img src="data:image/png;base64,{b64}"
+                 alt="DGRTA"
+                 style="
+                     width: 100%;
+                     height: auto;
+                     display: block;
+                     object-fit: contain;
+                     border-radius: 8px;
+                 " />
+            <div style="
+                text-align: center;
+                padding: 0.75rem 1rem;
+                color: #1a472a;
+                font-size: 1.75rem;
+                font-weight: bold;
+                margin: 0;
+                line-height: 1.4;
+            ">Consulta de dados contratuais</div>
+        </div>
+        """
+
+
+@st.cache_data(show_spinner=False)
+def _static_css() -> str:
+    """CSS estatico da pagina, lido uma unica vez de assets/app.css.
+
+    O bloco continua sendo emitido a cada rerun de proposito: o Streamlit
+    remove elementos que nao sao re-renderizados, entao um guard de sessao
+    derrubaria o estilo no segundo rerun — o ganho aqui e nao recarregar
+    nem re-parsear o literal de ~8KB no corpo de main().
+    """
+    css = (Path(__file__).parent / "assets" / "app.css").read_text(encoding="utf-8")
+    return f"<style>\n{css}\n</style>"
+
+
 def main() -> None:
     st.set_page_config(
         page_title="Consulta de dados contratuais",
@@ -406,251 +918,13 @@ def main() -> None:
         initial_sidebar_state="expanded",
     )
 
-    # Layout: sidebar branca, faixas verdes
-    st.markdown(
-        """
-        <style>
-        /* Esconde header padrao do Streamlit - NAO esconder collapsedControl (seta para expandir sidebar) */
-        #MainMenu, footer { visibility: hidden !important; }
-        header[data-testid="stHeader"] { visibility: hidden !important; height: 0 !important; min-height: 0 !important; overflow: visible !important; }
-        header { height: 0 !important; min-height: 0 !important; overflow: visible !important; }
-        /* Garante que o botao de expandir sidebar fique sempre visivel quando recolhida */
-        [data-testid="collapsedControl"],
-        [data-testid="stSidebar"] [data-testid="collapsedControl"] {
-            visibility: visible !important; display: flex !important; opacity: 1 !important; z-index: 9999 !important;
-        }
-        
-        .stApp { background-color: #f5f5f5 !important; }
-        
-        /* Sidebar verde mais claro (mesmo tom da barra superior) - fixa na lateral ao rolar */
-        [data-testid="stSidebar"],
-        [data-testid="stSidebar"] > div:first-child,
-        section[data-testid="stSidebar"] {
-            background: #5d8a6d !important;
-            border-right: 1px solid #4a7a55 !important;
-            width: 21rem !important;
-            max-width: 21rem !important;
-            position: sticky !important;
-            top: 0 !important;
-            align-self: start !important;
-            overflow-y: auto !important;
-        }
-        [data-testid="stSidebar"] .stMarkdown,
-        [data-testid="stSidebar"] h1, [data-testid="stSidebar"] h2, [data-testid="stSidebar"] h3,
-        [data-testid="stSidebar"] .stCaption,
-        [data-testid="stSidebar"] label { color: #ffffff !important; }
-        [data-testid="stSidebar"] .stButton button {
-            color: #2d5a3d !important; background: #ffffff !important;
-        }
-        /* Substitui "Drag and drop files here" por "Inclua o PDF aqui" */
-        [data-testid="stSidebar"] [data-testid="stFileUploader"] small,
-        [data-testid="stSidebar"] [data-testid="stFileUploader"] p,
-        [data-testid="stSidebar"] [data-testid="stFileUploader"] [data-testid="stFileUploaderDropzoneText"],
-        [data-testid="stSidebar"] .stFileUploader small,
-        [data-testid="stSidebar"] .stFileUploader p,
-        [data-testid="stSidebar"] div[data-testid="stFileUploader"] > div > div > small,
-        [data-testid="stSidebar"] div[data-testid="stFileUploader"] > div > div > p {
-            display: none !important;
-            visibility: hidden !important;
-            height: 0 !important;
-            overflow: hidden !important;
-            margin: 0 !important;
-            padding: 0 !important;
-            font-size: 0 !important;
-            line-height: 0 !important;
-        }
-        [data-testid="stSidebar"] [data-testid="stFileUploader"] > div > div:first-child::before,
-        [data-testid="stSidebar"] [data-testid="stFileUploader"] [data-testid="stFileUploaderDropzone"]::before {
-            content: "Inclua o PDF aqui";
-            display: block !important;
-            text-align: center;
-            color: #ffffff !important;
-            padding: 0.5rem 0;
-            font-size: 0.9rem;
-        }
-        
-        /* Area principal - espaco extra para area fixa de sugestoes + input */
-        main .block-container { 
-            padding: 1rem !important;
-            padding-bottom: 320px !important; 
-            background-color: #ffffff !important;
-            border-radius: 0 !important;
-            box-shadow: 0 1px 3px rgba(0,0,0,0.08);
-            margin-left: 0 !important;
-        }
-        
-        /* Barra de navegacao verde - fixa abaixo do banner */
-        .nav-bar-dgrta {
-            position: sticky !important;
-            top: 0 !important;
-            background: #2d5a3d !important;
-            padding: 0.5rem 1rem !important;
-            margin: -1rem -1rem 1rem -1rem !important;
-            display: flex !important;
-            gap: 1.5rem !important;
-            align-items: center !important;
-            z-index: 997 !important;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        }
-        .nav-bar-dgrta span { color: white !important; font-size: 0.95rem !important; cursor: pointer !important; }
-        
-        :root {
-            --dgrta-sidebar-w: 21rem;
-            --dgrta-chatbar-h: 130px; /* altura real aproximada do chat_input (evita sobreposicao) */
-            --dgrta-gap: 0px;
-            --dgrta-dock-bg: #e8e8e8;
-        }
-
-        /* Rodape fixo: sugestoes sempre acima do input (uma linha) */
-        #dgrta-sugestoes-dock {
-            position: fixed !important;
-            bottom: calc(var(--dgrta-chatbar-h) + var(--dgrta-gap)) !important; /* imediatamente acima do st.chat_input */
-            left: var(--dgrta-sidebar-w) !important;   /* NAO cobrir a sidebar */
-            right: 0 !important;
-            z-index: 998 !important;
-            background: var(--dgrta-dock-bg) !important;
-            padding: 0.4rem 0.75rem !important;
-            box-shadow: 0 -2px 10px rgba(0,0,0,0.08);
-            display: flex !important;
-            align-items: center !important;
-            gap: 0.75rem !important;
-        }
-        .dgrta-sug-label {
-            font-weight: 600;
-            color: #2d5a3d;
-            white-space: nowrap;
-            flex: 0 0 auto;
-            pointer-events: auto !important;
-        }
-        #dgrta-sug-row {
-            display: flex;
-            align-items: center;
-            gap: 0.5rem;
-            overflow-x: auto;
-            overflow-y: hidden;
-            white-space: nowrap;
-            flex: 1 1 auto;
-            padding-bottom: 0.15rem;
-            pointer-events: auto !important;
-        }
-        .dgrta-sug-btn {
-            display: inline-block;
-            background: #ffffff;
-            border: 1px solid #dcdcdc;
-            border-radius: 999px;
-            padding: 0.45rem 0.7rem;
-            color: #2d5a3d;
-            text-decoration: none;
-            text-align: center;
-            font-size: 0.9rem;
-            line-height: 1.2;
-            white-space: nowrap;
-            flex: 0 0 auto;
-            cursor: pointer;
-        }
-        .dgrta-sug-btn:hover {
-            border-color: #2d5a3d;
-        }
-        /* Input fixo no rodape (garante consistencia entre navegadores) */
-        [data-testid="stChatInputContainer"] {
-            position: fixed !important;
-            bottom: 0 !important;
-            left: var(--dgrta-sidebar-w) !important; /* NAO cobrir a sidebar */
-            right: 0 !important;
-            z-index: 999 !important;
-            background: var(--dgrta-dock-bg) !important;
-            padding: 0.5rem 1rem 0.75rem !important;
-            box-shadow: 0 -2px 10px rgba(0,0,0,0.1);
-            min-height: var(--dgrta-chatbar-h) !important;
-            box-sizing: border-box !important;
-        }
-        [data-testid="stChatInputContainer"] * { visibility: visible !important; }
-
-        /* Responsivo: em telas menores, ocupar a largura toda */
-        @media (max-width: 900px) {
-            :root { --dgrta-sidebar-w: 0rem; }
-        }
-        
-        /* Esconde só o avatar (não mexe na largura das colunas para não quebrar o texto) */
-        [data-testid="stChatMessageAvatar"],
-        [data-testid="stChatMessage"] [data-testid="stChatMessageAvatar"] {
-            display: none !important;
-        }
-        /* Nome do chat em destaque */
-        .dgrta-chat-nome {
-            font-weight: bold;
-            font-size: 0.95rem;
-            margin-bottom: 0.25rem;
-            color: inherit !important;
-        }
-        .dgrta-chat-nome.user { text-align: right; }
-        .dgrta-chat-nome.assistant { text-align: left; }
-
-        /* Fundo para separar perguntas das respostas */
-        [data-testid="stChatMessage"]:has(.dgrta-chat-nome.user) {
-            background: #f0f4f0 !important;
-            border-radius: 10px !important;
-            padding: 0.75rem 1rem !important;
-            margin-bottom: 0.5rem !important;
-            border-left: 4px solid #5d8a6d !important;
-        }
-        [data-testid="stChatMessage"]:has(.dgrta-chat-nome.assistant) {
-            background: #ffffff !important;
-            border-radius: 10px !important;
-            padding: 0.75rem 1rem !important;
-            margin-bottom: 0.5rem !important;
-            box-shadow: 0 1px 3px rgba(0,0,0,0.08) !important;
-            border-left: 4px solid #2d5a3d !important;
-        }
-
-        /* Banner */
-        #banner-dgrta {
-            width: calc(100vw - 21rem) !important;
-            margin-left: calc(-1 * (100vw - 21rem - 100%) / 2) !important;
-            max-width: none !important;
-            box-sizing: border-box !important;
-        }
-        #banner-dgrta img {
-            width: 100% !important;
-            height: auto !important;
-            object-fit: contain !important;
-            object-position: center !important;
-        }
-        </style>
-        """,
-        unsafe_allow_html=True,
-    )
-
+    # Layout: sidebar branca, faixas verdes (CSS estatico cacheado)
+    st.markdown(_static_css(), unsafe_allow_html=True)
     base_dir = Path(__file__).resolve().parents[1]
     banner_path = base_dir / "assets" / "banner_dgrta.png"
     if banner_path.exists():
-        b64 = _img_to_b64(str(banner_path))
         st.markdown(
-            f"""
-            <div id="banner-dgrta" style="
-                margin-bottom: 1rem;
-                border-radius: 8px;
-            ">
-                <img src="data:image/png;base64,{b64}" 
-                     alt="DGRTA" 
-                     style="
-                         width: 100%;
-                         height: auto;
-                         display: block;
-                         object-fit: contain;
-                         border-radius: 8px;
-                     " />
-                <div style="
-                    text-align: center;
-                    padding: 0.75rem 1rem;
-                    color: #1a472a;
-                    font-size: 1.75rem;
-                    font-weight: bold;
-                    margin: 0;
-                    line-height: 1.4;
-                ">Consulta de dados contratuais</div>
-            </div>
-            """,
+            _banner_html(str(banner_path), banner_path.stat().st_mtime),
             unsafe_allow_html=True,
         )
     else:
@@ -761,7 +1035,7 @@ def main() -> None:
         st.divider()
 
         sidebar_hist_ph = st.empty()
-        _render_sidebar_history(sidebar_hist_ph, st.session_state.messages)
+        _render_sidebar_history(sidebar_hist_ph, st.session_state.messages, sid)
 
         st.divider()
 
@@ -770,33 +1044,39 @@ def main() -> None:
         if st.button("🔄 Limpar histórico", use_container_width=True, key="btn_limpar"):
             st.session_state.messages = []
             st.session_state.follow_up_suggestions = None
-            try:
-                store[sid]["messages"] = []
-                store[sid]["follow_up_suggestions"] = None
-                store[sid]["_last_sug_for"] = None
-            except Exception:
-                pass
+            _store_update(
+                store, sid,
+                messages=[], follow_up_suggestions=None, _last_sug_for=None,
+            )
             st.rerun()
 
         st.divider()
 
         # Filtrar por documento
         st.subheader("📁 Filtrar por documento")
-        pdf_files = sorted(pdf_dir.glob("**/*.pdf")) if pdf_dir.exists() else []
-        opcoes = ["Todos os documentos"] + [p.name for p in pdf_files]
+        if pdf_dir.exists():
+            nomes_pdf = _list_pdfs(str(pdf_dir), pdf_dir.stat().st_mtime)
+        else:
+            nomes_pdf = []
+        opcoes = ["Todos os documentos"] + nomes_pdf
         filter_doc = st.selectbox("Buscar apenas em:", opcoes, key="filter_doc")
         doc_filter = None if filter_doc == "Todos os documentos" else filter_doc
 
     # Exibe historico de mensagens (nomes estilo ChatPetrobras: usuário logado e JackChat)
-    for i, msg in enumerate(st.session_state.messages):
-        nome_chat = CHAT_NOME_USUARIO if msg["role"] == "user" else CHAT_NOME_ASSISTENTE
-        with st.chat_message(nome_chat, avatar=_AVATAR_TRANSPARENTE):
-            st.markdown(f'<p class="dgrta-chat-nome {msg["role"]}">{_html.escape(nome_chat)}</p>', unsafe_allow_html=True)
+    for msg in st.session_state.messages:
+        role = msg["role"]
+        nome_chat = CHAT_NOME_USUARIO if role == "user" else CHAT_NOME_ASSISTENTE
+        with st.chat_message(nome_chat, avatar=_avatar()):
+            # Nome (HTML) e conteudo separados: o conteudo passa pelo
+            # st.markdown escapado padrao, como no render ao vivo
+            st.markdown(
+                f'<p class="dgrta-chat-nome {role}">{_html.escape(nome_chat)}</p>',
+                unsafe_allow_html=True,
+            )
             st.markdown(msg["content"])
             if msg.get("sources"):
                 with st.expander("📎 Fontes"):
-                    for s in msg["sources"]:
-                        st.write(f"• {s}")
+                    st.markdown("\n".join(f"- {s}" for s in msg["sources"]))
 
     # Sugestoes: padrao se sem pergunta; contextual com base na ultima pergunta/resposta
     msgs = st.session_state.messages
@@ -811,6 +1091,23 @@ def main() -> None:
         sugestoes_atuais = SUGESTOES_PADRAO
 
     # Sugestoes fixas no rodape (HTML). Clique -> ?sug=... -> vira prompt.
+    # Clique no historico da sidebar chega como ?hist=i (ancora, sem widget)
+    hist_from_url: str | None = None
+    try:
+        if "hist" in st.query_params:
+            raw = st.query_params.get("hist")
+            idx = int(raw[0] if isinstance(raw, list) else raw)
+            ultimas = _ultimas_perguntas(st.session_state.messages)
+            if 1 <= idx <= len(ultimas):
+                hist_from_url = ultimas[idx - 1]
+            try:
+                st.query_params.clear()
+                st.query_params["sid"] = sid
+            except Exception:
+                pass
+    except Exception:
+        hist_from_url = None
+
     sug_from_url: str | None = None
     try:
         if "sug" in st.query_params:
@@ -831,41 +1128,25 @@ def main() -> None:
         except Exception:
             sug_from_url = None
 
-    # Link HTML (sem JS): dispara ?sug=... na MESMA aba.
-    # (JS em onclick pode ser bloqueado pelo Streamlit/CSP em alguns navegadores)
-    sug_links = "\n".join(
-        f'<a class="dgrta-sug-btn" target="_self" href="?sid={quote(sid)}&sug={quote(s)}">{_html.escape(s)}</a>'
-        for s in sugestoes_atuais[:8]
-    )
     st.markdown(
-        f"""
-        <div id="dgrta-sugestoes-dock">
-          <span class="dgrta-sug-label">💡 Sugestões:</span>
-          <div id="dgrta-sug-row">
-            {sug_links}
-          </div>
-        </div>
-        """,
+        _render_sug_links(tuple(sugestoes_atuais[:8]), sid),
         unsafe_allow_html=True,
     )
 
     chat_value = st.chat_input("Digite sua pergunta sobre os contratos...")
     hist_click = st.session_state.pop("_hist_click", None)
-    prompt = hist_click or sug_from_url or chat_value
+    prompt = hist_click or hist_from_url or sug_from_url or chat_value
 
     if prompt:
         st.session_state.messages.append({"role": "user", "content": prompt})
-        try:
-            store[sid]["messages"] = list(st.session_state.messages)
-        except Exception:
-            pass
+        _store_update(store, sid, messages=list(st.session_state.messages))
 
-        with st.chat_message(CHAT_NOME_USUARIO, avatar=_AVATAR_TRANSPARENTE):
+        with st.chat_message(CHAT_NOME_USUARIO, avatar=_avatar()):
             st.markdown(f'<p class="dgrta-chat-nome user">{_html.escape(CHAT_NOME_USUARIO)}</p>', unsafe_allow_html=True)
             st.markdown(prompt)
 
         if not rag:
-            with st.chat_message(CHAT_NOME_ASSISTENTE, avatar=_AVATAR_TRANSPARENTE):
+            with st.chat_message(CHAT_NOME_ASSISTENTE, avatar=_avatar()):
                 st.markdown(f'<p class="dgrta-chat-nome assistant">{_html.escape(CHAT_NOME_ASSISTENTE)}</p>', unsafe_allow_html=True)
                 st.error("Não foi possível carregar o sistema. Verifique o arquivo .env e os PDFs na pasta Base.")
             st.session_state.messages.append({
@@ -874,17 +1155,24 @@ def main() -> None:
                 "sources": [],
             })
         else:
-            with st.chat_message(CHAT_NOME_ASSISTENTE, avatar=_AVATAR_TRANSPARENTE):
+            with st.chat_message(CHAT_NOME_ASSISTENTE, avatar=_avatar()):
                 st.markdown(f'<p class="dgrta-chat-nome assistant">{_html.escape(CHAT_NOME_ASSISTENTE)}</p>', unsafe_allow_html=True)
                 with st.status("⏳ Processando sua pergunta...", expanded=True):
                     st.write("1. Buscando trechos relevantes nos documentos...")
                     msgs = st.session_state.messages
-                    history = [
-                        (msgs[i]["content"], msgs[i + 1]["content"])
-                        for i in range(0, len(msgs) - 1, 2)
-                        if i + 1 < len(msgs) and msgs[i]["role"] == "user" and msgs[i + 1]["role"] == "assistant"
-                    ]
-                    answer, sources = answer_question(
+                    # Pareia pergunta/resposta checando os roles: uma mensagem
+                    # de usuario sem resposta (ex.: erro no stream anterior)
+                    # e pulada em vez de desalinhar os pares seguintes
+                    # (a pergunta atual, ainda sem resposta, fica de fora)
+                    history = []
+                    i = 0
+                    while i < len(msgs) - 1:
+                        if msgs[i]["role"] == "user" and msgs[i + 1]["role"] == "assistant":
+                            history.append((msgs[i]["content"], msgs[i + 1]["content"]))
+                            i += 2
+                        else:
+                            i += 1
+                    answer_stream, sources, follow_ups = answer_question_stream(
                         prompt,
                         rag["retriever"],
                         rag["llm"],
@@ -894,33 +1182,50 @@ def main() -> None:
                         vectorstore=rag.get("vectorstore"),
                     )
 
-                st.markdown(answer)
+                # Tokens aparecem conforme chegam; o retorno e a string completa,
+                # usada por historico, exports e sugestoes
+                answer = st.write_stream(answer_stream)
+                if not isinstance(answer, str):
+                    answer = "".join(str(p) for p in answer)
 
                 source_labels = [rag["get_source_label"](d) for d in sources]
+                fontes_t = tuple(source_labels)  # exporters cacheados exigem args hashaveis
+                now_str = _dt.now().strftime(_TS_FMT)  # mesmo carimbo em todos os formatos
                 if source_labels:
                     with st.expander("📎 Fontes consultadas"):
                         for s in source_labels:
                             st.write(f"• {s}")
 
-                # Botoes de exportacao (TXT, Word, Excel, PDF)
+                # Botoes de exportacao (TXT, Word, Excel, PDF) - montados em
+                # paralelo; o download_button exige os bytes no render, entao
+                # os futures sao resolvidos logo abaixo, coluna a coluna
+                rows = _extract_csv_table(answer)
+                fut_txt = _EXPORT_POOL.submit(_export_txt, prompt, answer, fontes_t)
+                fut_docx = _EXPORT_POOL.submit(_export_docx, prompt, answer, fontes_t, now_str)
+                if rows is not None:
+                    fut_xlsx = _EXPORT_POOL.submit(_export_xlsx_table, prompt, rows, fontes_t, now_str)
+                    xlsx_name = "consulta_tabela.xlsx"
+                else:
+                    fut_xlsx = _EXPORT_POOL.submit(_export_xlsx, prompt, answer, fontes_t, now_str)
+                    xlsx_name = "consulta_rag.xlsx"
+                fut_pdf = _EXPORT_POOL.submit(_export_pdf, prompt, answer, fontes_t)
+
                 col1, col2, col3, col4 = st.columns(4)
                 export_key = f"export_{len(st.session_state.messages)}"
 
                 with col1:
-                    txt_data = _export_txt(prompt, answer, source_labels)
                     st.download_button(
                         "📝 TXT",
-                        data=txt_data,
+                        data=fut_txt.result(),
                         file_name="consulta_rag.txt",
                         mime="text/plain",
                         key=f"{export_key}_txt",
                     )
                 with col2:
                     try:
-                        docx_bytes = _export_docx(prompt, answer, source_labels)
                         st.download_button(
                             "📘 Word",
-                            data=docx_bytes,
+                            data=fut_docx.result(),
                             file_name="consulta_rag.docx",
                             mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
                             key=f"{export_key}_docx",
@@ -929,17 +1234,10 @@ def main() -> None:
                         st.caption("python-docx não instalado")
                 with col3:
                     try:
-                        rows = _extract_csv_table(answer)
-                        if rows is not None:
-                            xlsx_bytes = _export_xlsx_table(prompt, rows, source_labels)
-                            file_name = "consulta_tabela.xlsx"
-                        else:
-                            xlsx_bytes = _export_xlsx(prompt, answer, source_labels)
-                            file_name = "consulta_rag.xlsx"
                         st.download_button(
                             "📊 Excel",
-                            data=xlsx_bytes,
-                            file_name=file_name,
+                            data=fut_xlsx.result(),
+                            file_name=xlsx_name,
                             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                             key=f"{export_key}_xlsx",
                         )
@@ -947,10 +1245,9 @@ def main() -> None:
                         st.caption("openpyxl não instalado")
                 with col4:
                     try:
-                        pdf_bytes = _export_pdf(prompt, answer, source_labels)
                         st.download_button(
                             "📕 PDF",
-                            data=pdf_bytes,
+                            data=fut_pdf.result(),
                             file_name="consulta_rag.pdf",
                             mime="application/pdf",
                             key=f"{export_key}_pdf",
@@ -966,34 +1263,29 @@ def main() -> None:
             # Limita historico a 5 trocas (10 mensagens: 5 user + 5 assistant)
             if len(st.session_state.messages) > 10:
                 st.session_state.messages = st.session_state.messages[-10:]
-            try:
-                store[sid]["messages"] = list(st.session_state.messages)
-            except Exception:
-                pass
+            _store_update(store, sid, messages=list(st.session_state.messages))
 
             # Atualiza histórico na sidebar no mesmo ciclo (sem rerun)
             try:
-                _render_sidebar_history(sidebar_hist_ph, st.session_state.messages)
+                _render_sidebar_history(sidebar_hist_ph, st.session_state.messages, sid)
             except Exception:
                 pass
-            # Gera sugestoes de acompanhamento com base na pergunta e resposta
-            try:
-                follow_ups = suggest_follow_up_questions(prompt, answer, rag["llm"])
-                if follow_ups:
-                    st.session_state.follow_up_suggestions = follow_ups
-                    st.session_state._last_sug_for = (prompt[:50], len(st.session_state.messages))
-                    try:
-                        store[sid]["follow_up_suggestions"] = follow_ups
-                        store[sid]["_last_sug_for"] = st.session_state._last_sug_for
-                    except Exception:
-                        pass
-            except Exception:
+            # Sugestoes ja vieram fundidas na resposta (bloco ---SUG---),
+            # sem segunda chamada ao LLM por turno
+            if follow_ups:
+                st.session_state.follow_up_suggestions = list(follow_ups)
+                st.session_state._last_sug_for = (prompt[:50], len(st.session_state.messages))
+                _store_update(
+                    store, sid,
+                    follow_up_suggestions=st.session_state.follow_up_suggestions,
+                    _last_sug_for=st.session_state._last_sug_for,
+                )
+            else:
                 st.session_state.follow_up_suggestions = SUGESTOES_PADRAO
-                try:
-                    store[sid]["follow_up_suggestions"] = SUGESTOES_PADRAO
-                    store[sid]["_last_sug_for"] = None
-                except Exception:
-                    pass
+                _store_update(
+                    store, sid,
+                    follow_up_suggestions=SUGESTOES_PADRAO, _last_sug_for=None,
+                )
 
 
 if __name__ == "__main__":
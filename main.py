@@ -74,7 +74,7 @@ def main() -> None:
             continue
 
         print("Processando... ", end="", flush=True)
-        answer, sources = answer_question(
+        answer, sources, _sugestoes = answer_question(
             question,
             rag["retriever"],
             rag["llm"],
@@ -4,49 +4,127 @@ Suporta busca hibrida (semantica + BM25) e chunking otimizado para contratos.
 """
 from __future__ import annotations
 
+import functools
+import mmap
 import os
 import pickle
+import re
 import shutil
+import unicodedata
+from collections import OrderedDict
 from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Any
 
 from dotenv import load_dotenv
 import httpx
-from langchain_chroma import Chroma
 from langchain_community.document_loaders import PyPDFLoader
-from langchain_community.document_loaders import PyMuPDFLoader
 from langchain_community.retrievers import BM25Retriever
 from langchain_core.documents import Document
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.retrievers import BaseRetriever
+from langchain_community.vectorstores import FAISS
 from langchain_openai import AzureChatOpenAI, AzureOpenAIEmbeddings
 
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+try:
+    import xxhash  # hash nao-criptografico em C (xxh3) para dedup de conteudo
+except ImportError:
+    xxhash = None
+
 
 # Chunking otimizado para contratos: rapido e eficiente
 CHUNK_SIZE = 1200       # Trechos medios - boa cobertura sem excesso de chunks
 CHUNK_OVERLAP = 100     # Overlap reduzido - menos redundancia, indexacao mais rapida
 RETRIEVER_K = 8         # Menos docs = recuperacao mais rapida
+RERANK_K = 40           # Candidatos recuperados quando o reranker local esta ativo
+
+# Indexacao: lotes grandes amortizam o HTTP do Azure; requisicoes em paralelo
+# deixam o tempo de cold-start limitado pela concorrencia do endpoint
+_EMBED_BATCH = 64
+_EMBED_WORKERS = 8
+
+_RAG_SYSTEM = (
+    "Voce e um assistente especializado em extrair e apresentar informacoes dos contratos e documentos PDF da base. "
+    "O contexto abaixo contem trechos extraidos dos arquivos. Sua tarefa e:\n"
+    "1. Responder a pergunta usando APENAS as informacoes presentes no contexto.\n"
+    "2. Use o historico da conversa (se fornecido) para entender perguntas de acompanhamento (ex: 'explique o item 2', 'qual o valor?').\n"
+    "3. Sempre indicar de qual arquivo/fonte veio cada informacao (ex: conforme o arquivo X, pagina Y).\n"
+    "4. Organize a resposta de forma clara. Liste itens quando apropriado (ex: ICJs, clausulas).\n"
+    "5. Se a informacao nao estiver no contexto, diga que nao encontrou no material disponivel.\n"
+    "6. Ao final da resposta, em uma nova linha, escreva exatamente '---SUG---' e, nas linhas "
+    "seguintes, liste 4 a 6 perguntas curtas de acompanhamento que o usuario poderia fazer "
+    "(ex: 'Explique melhor o item 2', 'Qual o valor mencionado?'), uma por linha, sem numeracao."
+)
+
+# Delimitador do bloco de sugestoes gerado junto com a resposta: evita uma
+# segunda chamada ao LLM por turno so para as perguntas de acompanhamento
+_SUG_DELIM = "---SUG---"
+
+
+def _parse_sug_lines(text: str) -> list[str]:
+    lines = [ln.strip().lstrip("-•").strip() for ln in text.strip().splitlines()]
+    return [ln for ln in lines if ln][:6]
+
 
-_RAG_PROMPT = ChatPromptTemplate.from_messages(
+def _split_sug(text: str) -> tuple[str, list[str]]:
+    """Separa (resposta, sugestoes) no delimitador _SUG_DELIM."""
+    answer, sep, rest = text.partition(_SUG_DELIM)
+    if not sep:
+        return text, []
+    return answer.rstrip(), _parse_sug_lines(rest)
+
+# Dois templates prontos no import: o caso comum (sem historico) nao paga a
+# interpolacao de {hist} nem envia o andaime vazio de historico ao modelo
+_RAG_PROMPT_NOHIST = ChatPromptTemplate.from_messages(
     [
-        (
-            "system",
-            "Voce e um assistente especializado em extrair e apresentar informacoes dos contratos e documentos PDF da base. "
-            "O contexto abaixo contem trechos extraidos dos arquivos. Sua tarefa e:\n"
-            "1. Responder a pergunta usando APENAS as informacoes presentes no contexto.\n"
-            "2. Use o historico da conversa (se fornecido) para entender perguntas de acompanhamento (ex: 'explique o item 2', 'qual o valor?').\n"
-            "3. Sempre indicar de qual arquivo/fonte veio cada informacao (ex: conforme o arquivo X, pagina Y).\n"
-            "4. Organize a resposta de forma clara. Liste itens quando apropriado (ex: ICJs, clausulas).\n"
-            "5. Se a informacao nao estiver no contexto, diga que nao encontrou no material disponivel.",
-        ),
+        ("system", _RAG_SYSTEM),
+        ("human", "Pergunta: {question}\n\nContexto (trechos dos documentos da base):\n{context}"),
+    ]
+)
+
+_RAG_PROMPT_HIST = ChatPromptTemplate.from_messages(
+    [
+        ("system", _RAG_SYSTEM),
         ("human", "{hist}\nPergunta: {question}\n\nContexto (trechos dos documentos da base):\n{context}"),
     ]
 )
 
 
+# Caches LRU de serving: perguntas repetidas (cliques em sugestao, refresh)
+# nao pagam de novo o embedding da query nem a busca hibrida.
+_EMBED_CACHE_MAX = 512
+_RETRIEVE_CACHE_MAX = 256
+_embed_cache: OrderedDict[str, list[float]] = OrderedDict()
+_retrieve_cache: OrderedDict[tuple[str, str], list[Document]] = OrderedDict()
+
+
+def _norm_query(question: str) -> str:
+    return unicodedata.normalize("NFKC", question).strip().lower()
+
+
+def _lru_put(cache: OrderedDict, key: Any, value: Any, maxsize: int) -> None:
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > maxsize:
+        cache.popitem(last=False)
+
+
+class _CachedQueryEmbeddings(AzureOpenAIEmbeddings):
+    """AzureOpenAIEmbeddings com LRU em embed_query (so a query; docs nao repetem)."""
+
+    def embed_query(self, text: str) -> list[float]:
+        key = _norm_query(text)
+        vec = _embed_cache.get(key)
+        if vec is None:
+            vec = super().embed_query(text)
+            _lru_put(_embed_cache, key, vec, _EMBED_CACHE_MAX)
+        else:
+            _embed_cache.move_to_end(key)
+        return vec
+
+
 def _get_env(name: str) -> str:
     value = os.getenv(name)
     if not value:
@@ -55,13 +133,21 @@ def _get_env(name: str) -> str:
 
 
 def _setup_ca_bundle(base_dir: Path) -> Path | None:
-    chain_path = os.getenv("CORP_CA_CHAIN_PATH")
+    # A chave inclui as env vars de certificado: mudou o .env, recalcula
+    env_key = tuple(
+        os.getenv(k, "")
+        for k in ("CORP_CA_CHAIN_PATH", "CORP_CA_CERT_PATH", "CORP_CA_ROOT_PATH")
+    )
+    return _setup_ca_bundle_cached(str(base_dir), env_key)
+
+
+@functools.lru_cache(maxsize=4)
+def _setup_ca_bundle_cached(base_dir_str: str, env_key: tuple[str, ...]) -> Path | None:
+    chain_path, corp_cert, corp_root = env_key
     if chain_path:
         path = Path(chain_path)
         if path.exists():
             return path
-    corp_cert = os.getenv("CORP_CA_CERT_PATH")
-    corp_root = os.getenv("CORP_CA_ROOT_PATH")
     cert_paths = []
     if corp_cert:
         cert_paths.extend(p.strip() for p in corp_cert.split(";") if p.strip())
@@ -74,15 +160,17 @@ def _setup_ca_bundle(base_dir: Path) -> Path | None:
     if not existing:
         return None
 
-    bundle_path = base_dir / "ca_bundle.pem"
+    bundle_path = Path(base_dir_str) / "ca_bundle.pem"
     try:
         import certifi
 
         parts = [Path(certifi.where()).read_bytes()]
         for p in existing:
             parts.append(p.read_bytes())
-        with open(bundle_path, "wb") as f:
-            f.write(b"\n".join(parts))
+        data = b"\n".join(parts)
+        # So regrava quando o conteudo mudou (evita I/O por startup/re-init)
+        if not (bundle_path.exists() and bundle_path.read_bytes() == data):
+            bundle_path.write_bytes(data)
         return bundle_path
     except Exception:
         return existing[0]
@@ -96,26 +184,69 @@ def _ensure_tiktoken_cache() -> None:
     cache_path.mkdir(parents=True, exist_ok=True)
 
 
+def _save_chunks(chunks: list[Document], persist_dir: Path) -> None:
+    """Grava os chunks em Parquet colunar (zstd); pickle como fallback."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        tbl = pa.table({
+            "text": [c.page_content for c in chunks],
+            "source": [c.metadata.get("source", "") for c in chunks],
+            "filename": [c.metadata.get("filename", "") for c in chunks],
+            "page": [int(c.metadata.get("page", -1)) for c in chunks],
+        })
+        pq.write_table(tbl, persist_dir / "chunks.parquet", compression="zstd")
+        return
+    except Exception:
+        pass
+    with open(persist_dir / "chunks.pkl", "wb") as f:
+        pickle.dump(chunks, f, protocol=5)
+
+
+def _load_chunks(persist_dir: Path) -> list[Document] | None:
+    """Le os chunks persistidos (Parquet via mmap; chunks.pkl de indices antigos)."""
+    parquet_file = persist_dir / "chunks.parquet"
+    if parquet_file.exists():
+        try:
+            import pyarrow.parquet as pq
+
+            tbl = pq.read_table(parquet_file, memory_map=True)
+            cols = [tbl.column(n).to_pylist() for n in ("text", "source", "filename", "page")]
+            chunks = []
+            for text, source, filename, page in zip(*cols):
+                metadata = {"source": source, "filename": filename}
+                if page >= 0:
+                    metadata["page"] = page
+                chunks.append(Document(page_content=text, metadata=metadata))
+            return chunks
+        except Exception:
+            pass
+    chunks_file = persist_dir / "chunks.pkl"
+    if chunks_file.exists():
+        try:
+            # mmap: o unpickle le paginas sob demanda, sem copiar o arquivo
+            # inteiro para um buffer intermediario
+            with open(chunks_file, "rb") as f, \
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return pickle.loads(mm)
+        except Exception:
+            pass
+    return None
+
+
 def _build_vectorstore(
     pdf_dir: Path, persist_dir: Path, embeddings: AzureOpenAIEmbeddings
-) -> tuple[Chroma, list[Document] | None]:
+) -> tuple[FAISS, list[Document] | None]:
     """Retorna (vectorstore, chunks para BM25 ou None)."""
     persist_dir.mkdir(parents=True, exist_ok=True)
     force_reindex = os.getenv("REINDEX", "").lower() in ("true", "1", "yes")
-    chunks_file = persist_dir / "chunks.pkl"
 
-    if not force_reindex and any(persist_dir.iterdir()):
-        vectorstore = Chroma(
-            persist_directory=str(persist_dir), embedding_function=embeddings
+    if not force_reindex and (persist_dir / "index.faiss").exists():
+        vectorstore = FAISS.load_local(
+            str(persist_dir), embeddings, allow_dangerous_deserialization=True
         )
-        chunks = None
-        if chunks_file.exists():
-            try:
-                with open(chunks_file, "rb") as f:
-                    chunks = pickle.load(f)
-            except Exception:
-                pass
-        return vectorstore, chunks
+        return vectorstore, _load_chunks(persist_dir)
 
     if force_reindex and persist_dir.exists():
         shutil.rmtree(persist_dir)
@@ -129,27 +260,24 @@ def _build_vectorstore(
     if not pdf_files:
         raise ValueError(f"Nenhum PDF encontrado em {pdf_dir_resolved}")
 
-    # Carrega PDFs em paralelo (PyMuPDF primeiro - mais rapido)
-    def _load_pdf(path: Path) -> list[Document]:
+    # Extrai texto por pagina direto do PyMuPDF (sem Document intermediario
+    # por pagina nem passe extra de metadata); PyPDFLoader fica como fallback
+    def _load_pdf(path: Path) -> list[tuple[int, str]]:
         try:
-            return PyMuPDFLoader(str(path)).load()
+            import fitz
+
+            with fitz.open(str(path)) as doc:
+                return [(i, page.get_text("text")) for i, page in enumerate(doc)]
         except Exception:
             try:
-                return PyPDFLoader(str(path)).load()
+                return [
+                    (d.metadata.get("page", i), d.page_content)
+                    for i, d in enumerate(PyPDFLoader(str(path)).load())
+                ]
             except Exception as e:
                 print(f"Aviso: erro ao carregar {path.name}: {e}")
                 return []
 
-    documents = []
-    with ThreadPoolExecutor(max_workers=4) as ex:
-        for doc_list in ex.map(_load_pdf, pdf_files):
-            documents.extend(doc_list)
-
-    for doc in documents:
-        src = doc.metadata.get("source", "")
-        if src:
-            doc.metadata["filename"] = Path(src).name
-
     # Separadores para contratos: paragrafos, clausulas, linhas (evita cortes no meio)
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=CHUNK_SIZE,
@@ -157,72 +285,188 @@ def _build_vectorstore(
         separators=["\n\n\n", "\n\n", "\n", ". ", " ", ""],
         length_function=len,
     )
-    chunks = splitter.split_documents(documents)
-
-    with open(chunks_file, "wb") as f:
-        pickle.dump(chunks, f)
 
-    print(f"Indexando {len(chunks)} trechos de {len(documents)} pagina(s) em {len(pdf_files)} arquivo(s)...")
+    chunks: list[Document] = []
+    n_pages = 0
+    workers = min(len(pdf_files), os.cpu_count() or 4)
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        for path, pages in zip(pdf_files, ex.map(_load_pdf, pdf_files)):
+            n_pages += len(pages)
+            for pageno, text in pages:
+                for piece in splitter.split_text(text):
+                    chunks.append(Document(
+                        page_content=piece,
+                        metadata={"source": str(path), "filename": path.name, "page": pageno},
+                    ))
+
+    _save_chunks(chunks, persist_dir)
+
+    # Tokeniza uma unica vez aqui: o startup seguinte so unpickla as tabelas
+    # do BM25 em vez de retokenizar o corpus inteiro em Python
+    try:
+        from rank_bm25 import BM25Okapi
 
-    vectorstore = Chroma.from_documents(
-        chunks, embeddings, persist_directory=str(persist_dir)
+        tokenized = [_BM25_TOKEN_RE.findall(d.page_content.lower()) for d in chunks]
+        with open(persist_dir / "bm25.pkl", "wb") as f:
+            pickle.dump(BM25Okapi(tokenized), f, protocol=5)
+    except Exception:
+        pass
+
+    print(f"Indexando {len(chunks)} trechos de {n_pages} pagina(s) em {len(pdf_files)} arquivo(s)...")
+
+    # Embeda em lotes concorrentes em vez de delegar ao from_documents;
+    # ex.map preserva a ordem, entao textos e vetores continuam alinhados
+    texts = [d.page_content for d in chunks]
+    batches = [texts[i:i + _EMBED_BATCH] for i in range(0, len(texts), _EMBED_BATCH)]
+    vectors: list[list[float]] = []
+    with ThreadPoolExecutor(max_workers=_EMBED_WORKERS) as ex:
+        for vecs in ex.map(embeddings.embed_documents, batches):
+            vectors.extend(vecs)
+
+    # FAISS: busca vetorial em kernels C++ (SIMD), sem SQLite no caminho quente.
+    # Para o tamanho atual da base um indice flat basta; IVF/PQ so compensaria
+    # com dezenas de milhares de chunks.
+    vectorstore = FAISS.from_embeddings(
+        list(zip(texts, vectors)), embeddings, metadatas=[d.metadata for d in chunks]
     )
+
+    # Quantizacao escalar int8: indice 4x menor e 4x menos banda de memoria
+    # por busca, com perda de recall tipicamente <1%. O add na mesma ordem
+    # preserva o mapeamento posicao->docstore; se algo falhar, fica o flat.
+    try:
+        import faiss
+        import numpy as np
+
+        xb = np.asarray(vectors, dtype=np.float32)
+        sq = faiss.IndexScalarQuantizer(xb.shape[1], faiss.ScalarQuantizer.QT_8bit)
+        sq.train(xb)
+        sq.add(xb)
+        vectorstore.index = sq
+    except Exception:
+        pass
+
+    vectorstore.save_local(str(persist_dir))
     return vectorstore, chunks
 
 
+_BM25_TOKEN_RE = re.compile(r"\w+")
+
+# Pool unico para a busca hibrida: evita criar/destruir threads a cada query
+_HYBRID_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hybrid-ret")
+
+
+@functools.lru_cache(maxsize=1)
+def _get_reranker() -> Any | None:
+    """CrossEncoder local (opcional); None quando desativado ou nao instalado."""
+    if os.getenv("RERANK", "true").lower() in ("false", "0", "no"):
+        return None
+    try:
+        from sentence_transformers import CrossEncoder
+
+        return CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
+    except Exception:
+        return None
+
+
+def _rerank_docs(question: str, docs: list[Document]) -> list[Document]:
+    """Reordena os candidatos com o cross-encoder e mantem os RETRIEVER_K melhores."""
+    ce = _get_reranker()
+    if ce is None or len(docs) <= RETRIEVER_K:
+        return docs[:RETRIEVER_K]
+    scores = ce.predict([(question, d.page_content) for d in docs], batch_size=32)
+    ranked = sorted(zip(scores, range(len(docs))), reverse=True)
+    return [docs[i] for _, i in ranked[:RETRIEVER_K]]
+
+
+class _BM25PrebuiltRetriever(BaseRetriever):
+    """BM25 carregado de bm25.pkl: usa o indice pre-tokenizado da indexacao."""
+
+    def __init__(self, bm25: Any, chunks: list[Document], k: int = RETRIEVER_K // 2):
+        super().__init__()
+        self.bm25 = bm25
+        self.chunks = chunks
+        self.k = k
+
+    def _get_relevant_documents(self, query: str) -> list[Document]:
+        tokens = _BM25_TOKEN_RE.findall(query.lower())
+        return self.bm25.get_top_n(tokens, self.chunks, n=self.k)
+
+
 class _HybridRetriever(BaseRetriever):
     """Combina busca semantica e BM25 (keyword)."""
 
-    def __init__(self, semantic_retriever: BaseRetriever, bm25_retriever: BM25Retriever, k: int = RETRIEVER_K):
+    def __init__(self, semantic_retriever: BaseRetriever, bm25_retriever: BaseRetriever, k: int = RETRIEVER_K):
         super().__init__()
         self.semantic = semantic_retriever
         self.bm25 = bm25_retriever
         self.k = k
 
     def _get_relevant_documents(self, query: str) -> list[Document]:
-        seen: set[tuple[str, str]] = set()
+        seen: set[int] = set()
         result: list[Document] = []
 
         def _add(doc: Document) -> None:
-            key = (doc.page_content[:100], doc.metadata.get("source", ""))
+            # Hash do conteudo inteiro: sem colisao de prefixo (boilerplate
+            # contratual repete os primeiros 100 chars com frequencia)
+            content = doc.page_content
+            if xxhash is not None:
+                key = xxhash.xxh3_64_intdigest(content.encode()) ^ hash(doc.metadata.get("source", ""))
+            else:
+                key = hash((content, doc.metadata.get("source", "")))
             if key not in seen:
                 seen.add(key)
                 result.append(doc)
 
-        with ThreadPoolExecutor(max_workers=2) as ex:
-            f_sem = ex.submit(self.semantic.invoke, query)
-            f_bm25 = ex.submit(self.bm25.invoke, query)
-            for doc in f_sem.result()[: self.k // 2]:
-                _add(doc)
-            for doc in f_bm25.result()[: self.k - len(result)]:
-                _add(doc)
+        f_sem = _HYBRID_POOL.submit(self.semantic.invoke, query)
+        f_bm25 = _HYBRID_POOL.submit(self.bm25.invoke, query)
+        for doc in f_sem.result()[: self.k // 2]:
+            _add(doc)
+        for doc in f_bm25.result()[: self.k - len(result)]:
+            _add(doc)
         return result[: self.k]
 
 
 def _create_retriever(
-    vectorstore: Chroma, chunks: list[Document] | None, use_hybrid: bool = True
+    vectorstore: FAISS,
+    chunks: list[Document] | None,
+    use_hybrid: bool = True,
+    persist_dir: Path | None = None,
 ) -> BaseRetriever:
     """Cria retriever (hibrido ou apenas semantico)."""
-    semantic_retriever = vectorstore.as_retriever(search_kwargs={"k": RETRIEVER_K})
+    # Com reranker local ativo, recupera um conjunto maior de candidatos;
+    # answer_question depois reordena e corta em RETRIEVER_K
+    k = RERANK_K if _get_reranker() is not None else RETRIEVER_K
+    semantic_retriever = vectorstore.as_retriever(search_kwargs={"k": k})
 
     if use_hybrid and chunks:
         try:
-            bm25_retriever = BM25Retriever.from_documents(chunks, k=RETRIEVER_K // 2)
-            return _HybridRetriever(semantic_retriever, bm25_retriever)
+            bm25_file = persist_dir / "bm25.pkl" if persist_dir else None
+            if bm25_file is not None and bm25_file.exists():
+                with open(bm25_file, "rb") as f, \
+                        mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    bm25 = pickle.loads(mm)
+                return _HybridRetriever(
+                    semantic_retriever,
+                    _BM25PrebuiltRetriever(bm25, chunks, k=k // 2),
+                    k=k,
+                )
+            bm25_retriever = BM25Retriever.from_documents(chunks, k=k // 2)
+            return _HybridRetriever(semantic_retriever, bm25_retriever, k=k)
         except Exception:
             pass
     return semantic_retriever
 
 
-_TERMOS_BASE = frozenset(("na base", "na pasta", "na pasta base", "base de"))
-_TERMOS_ARQUIVO = frozenset(("pdf", "pdfs", "arquivo", "arquivos", "documento", "documentos"))
+# Vocabulario compilado em duas alternacoes: uma chamada search em C por
+# grupo, em vez de varios scans `in` por pergunta. Os lookaheads cobrem o
+# caso "base" + esta/tem em qualquer ordem.
+_RE_BASE = re.compile(r"na (?:base|pasta)|base de|(?=.*base)(?=.*(?:esta|tem))", re.S)
+_RE_ARQUIVO = re.compile(r"pdf|arquivo|documento|quais|lista|o que")
 
 
 def _is_question_about_pdfs_in_base(question: str) -> bool:
-    q = question.lower().strip()
-    tem_base = any(t in q for t in _TERMOS_BASE) or ("base" in q and ("esta" in q or "tem" in q))
-    tem_arquivo = any(t in q for t in _TERMOS_ARQUIVO) or "quais" in q or "lista" in q
-    return tem_base and (tem_arquivo or "quais" in q or "lista" in q or "o que" in q)
+    q = question.lower()
+    return bool(_RE_BASE.search(q) and _RE_ARQUIVO.search(q))
 
 
 def _list_pdfs_in_base(pdf_dir: Path) -> tuple[str, list]:
@@ -248,27 +492,26 @@ def _get_source_label(doc: Document) -> str:
     return "Documento"
 
 
-def answer_question(
+_MSG_SEM_TRECHOS = (
+    "Nenhum trecho relevante encontrado nos documentos. "
+    "Tente reformular a pergunta ou defina REINDEX=true no .env para reindexar."
+)
+
+
+def _retrieve_docs(
     question: str,
     retriever: BaseRetriever,
-    llm: AzureChatOpenAI,
-    pdf_dir: Path,
-    *,
-    history: list[tuple[str, str]] | None = None,
-    filter_source: str | None = None,
-    vectorstore: Chroma | None = None,
-) -> tuple[str, list[Document]]:
-    """Responde pergunta usando RAG ou lista de PDFs.
-    history: ultimas (pergunta, resposta) para contexto de acompanhamento.
-    filter_source: nome do arquivo para filtrar (ex: Contrato 5900.0122983.22.2.pdf).
-    """
-    if _is_question_about_pdfs_in_base(question):
-        resposta, _ = _list_pdfs_in_base(pdf_dir)
-        return resposta, []
-
-    if filter_source and vectorstore:
-        # Chroma: $eq para filename; fallback: busca sem filtro e filtra em Python
-        filter_dict = {"filename": {"$eq": filter_source}}
+    filter_source: str | None,
+    vectorstore: FAISS | None,
+) -> list[Document]:
+    """Recupera (com cache LRU e rerank) os docs para a pergunta."""
+    qkey = (_norm_query(question), filter_source or "")
+    docs = _retrieve_cache.get(qkey)
+    if docs is not None:
+        _retrieve_cache.move_to_end(qkey)
+    elif filter_source and vectorstore:
+        # FAISS: filtro por igualdade de metadata; fallback: busca sem filtro e filtra em Python
+        filter_dict = {"filename": filter_source}
         try:
             docs = vectorstore.similarity_search(question, k=RETRIEVER_K, filter=filter_dict)
         except Exception:
@@ -281,31 +524,145 @@ def answer_question(
             docs = docs[:RETRIEVER_K]
     else:
         docs = retriever.invoke(question)
-    if not docs:
-        return (
-            "Nenhum trecho relevante encontrado nos documentos. "
-            "Tente reformular a pergunta ou defina REINDEX=true no .env para reindexar.",
-            [],
-        )
+        docs = _rerank_docs(question, docs)
+    if docs and qkey not in _retrieve_cache:
+        _lru_put(_retrieve_cache, qkey, docs, _RETRIEVE_CACHE_MAX)
+    return docs
+
+
+_CONTEXT_TOKEN_BUDGET = 3000  # teto de tokens de contexto enviados ao LLM
+
+
+@functools.lru_cache(maxsize=1)
+def _get_encoder() -> Any | None:
+    try:
+        import tiktoken
+
+        return tiktoken.encoding_for_model("gpt-4o")
+    except Exception:
+        return None
+
+
+def _build_chain_payload(
+    question: str, docs: list[Document], history: list[tuple[str, str]] | None
+) -> tuple[Any, dict[str, str]]:
+    """Monta (template, payload) para a chamada ao LLM."""
+    # Orcamento de tokens dividido por chunk: prompt com tamanho previsivel
+    # (e custo/TTFT idem) mesmo em contratos longos
+    texts = [d.page_content for d in docs]
+    enc = _get_encoder()
+    if enc is not None:
+        budget = _CONTEXT_TOKEN_BUDGET // len(docs)
+        tok_lists = enc.encode_batch(texts)
+        texts = [
+            enc.decode(toks[:budget]) if len(toks) > budget else text
+            for text, toks in zip(texts, tok_lists)
+        ]
+    else:
+        # Sem tiktoken: corte aproximado por caracteres (~4 chars/token em pt)
+        budget = (_CONTEXT_TOKEN_BUDGET * 4) // len(docs)
+        texts = [t[:budget] for t in texts]
 
     context = "\n\n".join(
-        f"[Fonte {i + 1} - {_get_source_label(doc)}]\n{doc.page_content}"
-        for i, doc in enumerate(docs)
+        f"[Fonte {i + 1} - {_get_source_label(doc)}]\n{text}"
+        for i, (doc, text) in enumerate(zip(docs, texts))
     )
-
-    hist_text = ""
+    payload = {"question": question, "context": context}
     if history:
         hist_parts = ["\n\nHistorico da conversa (para contexto):\n"]
         hist_parts.extend(f"P: {p}\nR: {r}\n\n" for p, r in history[-5:])
-        hist_text = "".join(hist_parts)
+        payload["hist"] = "".join(hist_parts)
+        return _RAG_PROMPT_HIST, payload
+    return _RAG_PROMPT_NOHIST, payload
+
+
+def answer_question(
+    question: str,
+    retriever: BaseRetriever,
+    llm: AzureChatOpenAI,
+    pdf_dir: Path,
+    *,
+    history: list[tuple[str, str]] | None = None,
+    filter_source: str | None = None,
+    vectorstore: FAISS | None = None,
+) -> tuple[str, list[Document], list[str]]:
+    """Responde pergunta usando RAG ou lista de PDFs.
+    Retorna (resposta, docs, sugestoes de acompanhamento).
+    history: ultimas (pergunta, resposta) para contexto de acompanhamento.
+    filter_source: nome do arquivo para filtrar (ex: Contrato 5900.0122983.22.2.pdf).
+    """
+    if _is_question_about_pdfs_in_base(question):
+        resposta, _ = _list_pdfs_in_base(pdf_dir)
+        return resposta, [], []
+
+    docs = _retrieve_docs(question, retriever, filter_source, vectorstore)
+    if not docs:
+        return _MSG_SEM_TRECHOS, [], []
+
+    tmpl, payload = _build_chain_payload(question, docs, history)
+    response = (tmpl | llm).invoke(payload)
+    answer, follow_ups = _split_sug(response.content)
+    return answer, docs, follow_ups
+
+
+def answer_question_stream(
+    question: str,
+    retriever: BaseRetriever,
+    llm: AzureChatOpenAI,
+    pdf_dir: Path,
+    *,
+    history: list[tuple[str, str]] | None = None,
+    filter_source: str | None = None,
+    vectorstore: FAISS | None = None,
+) -> tuple[Any, list[Document], list[str]]:
+    """Versao streaming de answer_question: retorna (gerador, docs, sugestoes).
+
+    O gerador produz os tokens conforme chegam do modelo (chain.stream),
+    retendo o bloco '---SUG---'; a lista de sugestoes e preenchida quando o
+    gerador termina. Nos atalhos sem LLM (lista de PDFs, nenhum trecho) o
+    gerador produz a resposta inteira de uma vez. A CLI segue no invoke.
+    """
+    if _is_question_about_pdfs_in_base(question):
+        resposta, _ = _list_pdfs_in_base(pdf_dir)
+        return iter((resposta,)), [], []
 
-    chain = _RAG_PROMPT | llm
-    response = chain.invoke({
-        "question": question,
-        "context": context,
-        "hist": hist_text,
-    })
-    return response.content, docs
+    docs = _retrieve_docs(question, retriever, filter_source, vectorstore)
+    if not docs:
+        return iter((_MSG_SEM_TRECHOS,)), [], []
+
+    tmpl, payload = _build_chain_payload(question, docs, history)
+    chain = tmpl | llm
+    follow_ups: list[str] = []
+
+    def _gen():
+        stream = chain.stream(payload)
+        buf = ""
+        saw_delim = False
+        for part in stream:
+            text = getattr(part, "content", "")
+            if not text:
+                continue
+            buf += text
+            idx = buf.find(_SUG_DELIM)
+            if idx != -1:
+                if idx:
+                    yield buf[:idx].rstrip()
+                buf = buf[idx + len(_SUG_DELIM):]
+                saw_delim = True
+                break
+            # Segura um sufixo que ainda pode ser o inicio do delimitador
+            safe = len(buf) - (len(_SUG_DELIM) - 1)
+            if safe > 0:
+                yield buf[:safe]
+                buf = buf[safe:]
+        if saw_delim:
+            for part in stream:
+                buf += getattr(part, "content", "")
+            follow_ups.extend(_parse_sug_lines(buf))
+        elif buf:
+            yield buf
+
+    return _gen(), docs, follow_ups
 
 
 def suggest_follow_up_questions(question: str, answer: str, llm: Any) -> list[str]:
@@ -329,9 +686,50 @@ def suggest_follow_up_questions(question: str, answer: str, llm: Any) -> list[st
         return []
 
 
+@functools.lru_cache(maxsize=4)
+def _build_clients(
+    endpoint: str,
+    api_key: str,
+    api_version: str,
+    chat_deployment: str,
+    embed_deployment: str,
+    ssl_verify: bool | str,
+) -> tuple[AzureChatOpenAI, AzureOpenAIEmbeddings]:
+    """Clientes Azure reutilizados entre re-inits/reruns (lru_cache).
+
+    Cada httpx.Client carrega pool de conexoes e sessao TLS proprios;
+    recria-los a cada init_rag vazava descritores em sessoes longas.
+    """
+    apim_headers = {"Ocp-Apim-Subscription-Key": api_key}
+    http_client = httpx.Client(
+        verify=ssl_verify,
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+        timeout=60.0,
+    )
+    llm = AzureChatOpenAI(
+        azure_endpoint=endpoint,
+        api_key=api_key,
+        api_version=api_version,
+        azure_deployment=chat_deployment,
+        temperature=0.1,
+        http_client=http_client,
+        default_headers=apim_headers,
+    )
+    embeddings = _CachedQueryEmbeddings(
+        azure_endpoint=endpoint,
+        api_key=api_key,
+        api_version=api_version,
+        azure_deployment=embed_deployment,
+        http_client=http_client,
+        default_headers=apim_headers,
+    )
+    return llm, embeddings
+
+
 def rebuild_rag(base_dir: Path, rag_components: dict[str, Any]) -> dict[str, Any]:
     """Forca reindexacao (apos upload de PDFs)."""
     os.environ["REINDEX"] = "true"
+    _retrieve_cache.clear()  # resultados antigos apontam para o indice anterior
     try:
         return init_rag(base_dir)
     finally:
@@ -341,7 +739,6 @@ def rebuild_rag(base_dir: Path, rag_components: dict[str, Any]) -> dict[str, Any
 def init_rag(base_dir: Path) -> dict[str, Any]:
     """Inicializa RAG e retorna componentes (retriever, llm, pdf_dir, etc)."""
     load_dotenv()
-    _setup_ca_bundle(base_dir)
     _ensure_tiktoken_cache()
 
     verify_ssl = os.getenv("VERIFY_SSL", "true").lower() not in ("false", "0", "no")
@@ -362,37 +759,20 @@ def init_rag(base_dir: Path) -> dict[str, Any]:
         else:
             ssl_verify = True
 
-    endpoint = _get_env("AZURE_OPENAI_ENDPOINT")
-    api_key = _get_env("API_KEY_MODELOS_TEXTO")
-    api_version = _get_env("AZURE_OPENAI_API_VERSION")
-    chat_deployment = _get_env("AZURE_OPENAI_CHAT_DEPLOYMENT")
-    embed_deployment = _get_env("AZURE_OPENAI_EMBEDDINGS_DEPLOYMENT")
-    apim_headers = {"Ocp-Apim-Subscription-Key": api_key}
-
-    http_client = httpx.Client(verify=ssl_verify)
-    llm = AzureChatOpenAI(
-        azure_endpoint=endpoint,
-        api_key=api_key,
-        api_version=api_version,
-        azure_deployment=chat_deployment,
-        temperature=0.1,
-        http_client=http_client,
-        default_headers=apim_headers,
-    )
-    embeddings = AzureOpenAIEmbeddings(
-        azure_endpoint=endpoint,
-        api_key=api_key,
-        api_version=api_version,
-        azure_deployment=embed_deployment,
-        http_client=http_client,
-        default_headers=apim_headers,
+    llm, embeddings = _build_clients(
+        _get_env("AZURE_OPENAI_ENDPOINT"),
+        _get_env("API_KEY_MODELOS_TEXTO"),
+        _get_env("AZURE_OPENAI_API_VERSION"),
+        _get_env("AZURE_OPENAI_CHAT_DEPLOYMENT"),
+        _get_env("AZURE_OPENAI_EMBEDDINGS_DEPLOYMENT"),
+        ssl_verify,
     )
 
     pdf_dir = base_dir / "Base"
     persist_dir = base_dir / "vectorstore"
 
     vectorstore, chunks = _build_vectorstore(pdf_dir, persist_dir, embeddings)
-    retriever = _create_retriever(vectorstore, chunks)
+    retriever = _create_retriever(vectorstore, chunks, persist_dir=persist_dir)
 
     return {
         "retriever": retriever,
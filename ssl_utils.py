@@ -0,0 +1,19 @@
+"""
+Contextos SSL compartilhados entre test_api_petrobras e validar_certificado.
+"""
+from __future__ import annotations
+
+import functools
+import ssl
+
+
+@functools.lru_cache(maxsize=8)
+def get_context(cafile: str | None, mtime_ns: int = 0) -> ssl.SSLContext:
+    """SSLContext memoizado por (cafile, mtime do arquivo).
+
+    O parse do trust store pelo OpenSSL acontece uma vez por versao do
+    arquivo; quando o bundle e regravado, o mtime_ns muda e invalida a
+    entrada. Callers passam (str(path), path.stat().st_mtime_ns), ou
+    (None, 0) para o trust store padrao.
+    """
+    return ssl.create_default_context(cafile=cafile)
@@ -4,20 +4,86 @@ Usa endpoint LiteLLM e header Ocp-Apim-Subscription-Key.
 """
 from __future__ import annotations
 
+import functools
+import json
 import os
+import shutil
+import ssl
 from pathlib import Path
 
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
+from ssl_utils import get_context
+
+
+class _SSLContextAdapter(HTTPAdapter):
+    """HTTPAdapter que injeta um ssl.SSLContext pre-construido no pool."""
+
+    def __init__(self, ssl_context: ssl.SSLContext | None = None, **kwargs):
+        self._ssl_context = ssl_context
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        if self._ssl_context is not None:
+            kwargs["ssl_context"] = self._ssl_context
+        return super().init_poolmanager(*args, **kwargs)
+
+
+@functools.lru_cache(maxsize=4)
+def _session_for(verify: bool | str) -> requests.Session:
+    """Session com pool de conexoes por valor de verify.
+
+    O trust store e parseado uma vez na criacao do contexto (memoizado em
+    ssl_utils por versao do arquivo); chamadas seguintes reaproveitam a
+    conexao TLS do pool em vez de refazer handshake e releitura do bundle.
+    """
+    session = requests.Session()
+    ctx = (
+        get_context(verify, Path(verify).stat().st_mtime_ns)
+        if isinstance(verify, str)
+        else None
+    )
+    session.mount("https://", _SSLContextAdapter(
+        ssl_context=ctx, pool_connections=1, pool_maxsize=4
+    ))
+    return session
+
+
+# Snapshot do ambiente no load: _get_env le um dict plano em vez de passar
+# pelo decode do os.environ a cada chamada; main() ressincroniza apos o dotenv
+_ENV = dict(os.environ)
+
 
 def _get_env(name: str, default: str | None = None) -> str | None:
-    value = os.getenv(name)
+    value = _ENV.get(name)
     if value:
         return value
     return default
 
 
+def _load_env() -> None:
+    """Carrega o .env so quando ainda nao foi carregado neste processo.
+
+    Evita a caminhada de diretorios + parse do dotenv quando o ambiente ja
+    veio pronto (CI, processo pai); o flag e herdado por subprocessos.
+    """
+    if os.environ.get("PETROBRAS_ENV_LOADED") != "1":
+        load_dotenv()
+        os.environ["PETROBRAS_ENV_LOADED"] = "1"
+    _ENV.update(os.environ)
+
+
+def _bundle_manifest(sources: list[Path]) -> list[list]:
+    """[caminho, mtime_ns, tamanho] de cada arquivo fonte do bundle."""
+    entries = []
+    for p in sources:
+        st = p.stat()
+        entries.append([str(p), st.st_mtime_ns, st.st_size])
+    return entries
+
+
 def _setup_ca_verify(base_dir: Path):
     """Usa CORP_CA_CHAIN_PATH (cadeia completa) ou monta certifi + CA(s)."""
     chain_path = _get_env("CORP_CA_CHAIN_PATH")
@@ -38,20 +104,38 @@ def _setup_ca_verify(base_dir: Path):
         import certifi
 
         bundle_path = base_dir / "ca_bundle.pem"
-        parts = [Path(certifi.where()).read_bytes()]
-        for p in cert_paths:
-            path = Path(p)
-            if path.exists():
-                parts.append(path.read_bytes())
-        with open(bundle_path, "wb") as f:
-            f.write(b"\n".join(parts))
+        manifest_path = base_dir / "ca_bundle.pem.manifest"
+        sources = [Path(certifi.where())]
+        sources.extend(Path(p) for p in cert_paths if Path(p).exists())
+
+        # Manifesto com mtime/tamanho das fontes: se nada mudou, reusa o
+        # bundle existente sem reler nenhum PEM nem regravar o arquivo
+        manifest = _bundle_manifest(sources)
+        if bundle_path.exists():
+            try:
+                if json.loads(manifest_path.read_text()) == manifest:
+                    return str(bundle_path)
+            except Exception:
+                pass
+
+        # Streaming em blocos de 64 KiB: memoria constante seja qual for o
+        # tamanho das fontes, sem a lista de buffers nem o join
+        with open(bundle_path, "wb") as dst:
+            for i, p in enumerate(sources):
+                if i:
+                    dst.write(b"\n")
+                with open(p, "rb") as src:
+                    shutil.copyfileobj(src, dst, length=65536)
+        tmp_path = manifest_path.with_name(manifest_path.name + ".tmp")
+        tmp_path.write_text(json.dumps(manifest))
+        os.replace(tmp_path, manifest_path)
         return str(bundle_path)
     except Exception:
         return True
 
 
 def main() -> None:
-    load_dotenv()
+    _load_env()
 
     base_dir = Path(__file__).resolve().parents[1]
 
@@ -62,24 +146,32 @@ def main() -> None:
     api_key = _get_env("API_KEY_MODELOS_TEXTO")
     model = _get_env("LITELLM_MODEL") or "gpt-4"
 
-    verify = _setup_ca_verify(base_dir)
-
-    # Opção para rede corporativa com proxy/inspection SSL
-    if _get_env("VERIFY_SSL", "true").lower() in ("false", "0", "no"):
-        verify = False
-        print("Aviso: VERIFY_SSL=false - SSL desabilitado (apenas para teste)")
-
-    # USE_SYSTEM_CA=true: usa certificados do sistema, sem definir SSL_CERT_FILE
+    # Flags primeiro: quando a validacao esta desativada ou usa a CA do
+    # sistema, nem toca no disco para montar o bundle
     if _get_env("USE_SYSTEM_CA", "").lower() in ("true", "1", "yes"):
+        # USE_SYSTEM_CA=true: trust store nativo do SO (Cert Store/Keychain/
+        # /etc/ssl/certs) via truststore, sem parsear o PEM do certifi
         verify = True
-        if "SSL_CERT_FILE" in os.environ:
-            del os.environ["SSL_CERT_FILE"]
-        if "REQUESTS_CA_BUNDLE" in os.environ:
-            del os.environ["REQUESTS_CA_BUNDLE"]
-        print("Aviso: USE_SYSTEM_CA=true - usando certificados do sistema (sem SSL_CERT_FILE)")
-    elif verify and isinstance(verify, str):
-        os.environ["REQUESTS_CA_BUNDLE"] = verify
-        os.environ["SSL_CERT_FILE"] = verify
+        try:
+            import truststore
+
+            truststore.inject_into_ssl()
+            print("Aviso: USE_SYSTEM_CA=true - usando trust store nativo do sistema")
+        except ImportError:
+            # Sem truststore instalado, ao menos impede que as variaveis
+            # apontem para um bundle em arquivo
+            os.environ.pop("SSL_CERT_FILE", None)
+            os.environ.pop("REQUESTS_CA_BUNDLE", None)
+            print("Aviso: USE_SYSTEM_CA=true - usando certificados do sistema (sem SSL_CERT_FILE)")
+    elif _get_env("VERIFY_SSL", "true").lower() in ("false", "0", "no"):
+        # Opção para rede corporativa com proxy/inspection SSL
+        verify = False
+        print("Aviso: VERIFY_SSL=false - SSL desabilitado (apenas para teste)")
+    else:
+        verify = _setup_ca_verify(base_dir)
+        if verify and isinstance(verify, str):
+            os.environ["REQUESTS_CA_BUNDLE"] = verify
+            os.environ["SSL_CERT_FILE"] = verify
 
     if not api_key:
         print("Erro: defina API_KEY_MODELOS_TEXTO no .env")
@@ -106,7 +198,7 @@ def main() -> None:
     print("-" * 50)
 
     try:
-        response = requests.post(
+        response = _session_for(verify).post(
             endpoint,
             headers=headers,
             json=payload,
